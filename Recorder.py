@@ -15,6 +15,8 @@ from pynput import mouse, keyboard
 import imageio.v3 as iio
 from io import BytesIO
 
+from server.encoder import profile_args, resolve_profile
+
 class IdleScreenRecorder:
     def __init__(
         self,
@@ -25,6 +27,7 @@ class IdleScreenRecorder:
         pixel_threshold: int = 5,
         change_ratio_threshold: float = 0.01,
         use_input_listeners: bool = True,
+        encoder_profile: str = "fast-upload",
     ):
         self.idle_seconds = idle_seconds
         self.check_interval = check_interval
@@ -33,6 +36,7 @@ class IdleScreenRecorder:
         self.pixel_threshold = pixel_threshold
         self.change_ratio_threshold = change_ratio_threshold
         self.use_input_listeners = use_input_listeners
+        self.encoder_profile = resolve_profile(encoder_profile)
 
         self._last_activity_time = time.time()
         self._activity_lock = threading.Lock()
@@ -113,7 +117,9 @@ class IdleScreenRecorder:
             self._frames,
             format="mp4",
             fps=self.fps,
-            codec="h264",
+            codec="libx264",
+            output_params=profile_args(self.encoder_profile, self.fps),
+            pixelformat=self.encoder_profile.get("pix_fmt", "yuv420p"),
         )
         buffer.seek(0)
         self._video_buffer = buffer
@@ -1,10 +1,10 @@
 import time
 import threading
-import numpy as np
 import Quartz
 from io import BytesIO
 import imageio.v3 as iio
 from pynput import mouse, keyboard
+from frame_source import QuartzFrameSource
 
 class QuartzVideoEngine:
     def __init__(self, fps: int = 10):
@@ -21,6 +21,7 @@ class QuartzVideoEngine:
         
         # Window Tracking
         self.target_window_id = None
+        self._source = None
         # We will set these after capturing the first frame
         self.fixed_width = 0
         self.fixed_height = 0
@@ -52,38 +53,8 @@ class QuartzVideoEngine:
 
     def _capture_window(self):
         if not self.target_window_id: return None
-
-        image_ref = Quartz.CGWindowListCreateImage(
-            Quartz.CGRectNull,
-            Quartz.kCGWindowListOptionIncludingWindow,
-            self.target_window_id,
-            Quartz.kCGWindowImageBoundsIgnoreFraming | Quartz.kCGWindowImageNominalResolution
-        )
-        
-        if not image_ref: return None
-
-        width = Quartz.CGImageGetWidth(image_ref)
-        height = Quartz.CGImageGetHeight(image_ref)
-        pixel_data = Quartz.CGDataProviderCopyData(Quartz.CGImageGetDataProvider(image_ref))
-        img_array = np.frombuffer(pixel_data, dtype=np.uint8)
-        
-        try:
-            # Reshape to (Height, Width, 4) (BGRA)
-            img = img_array.reshape((height, width, 4))
-            
-            # 1. Drop Alpha to get RGB
-            img = img[:, :, :3]
-
-            # 2. FORCE EVEN DIMENSIONS (Crucial Fix)
-            # If height is 1095, we slice it to 1094.
-            # If width is 1793, we slice to 1792.
-            h_even = height - (height % 2)
-            w_even = width - (width % 2)
-            img = img[:h_even, :w_even, :]
-            
-            return img
-        except ValueError:
-            return None
+        # Even-sized RGB copy of the window (see frame_source.QuartzFrameSource)
+        return self._source.capture()
 
     def _activity_callback(self, *args):
         self.last_activity = time.time()
@@ -92,6 +63,7 @@ class QuartzVideoEngine:
         if self.recording: return "Already recording"
         
         self.target_window_id = window_id
+        self._source = QuartzFrameSource(window_id)
         
         # Test capture to set dimensions
         first_frame = self._capture_window()
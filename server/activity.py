@@ -0,0 +1,112 @@
+import numpy as np
+
+
+# ─────────────────────────────────────────────────────────
+# ACTIVITY DETECTORS
+# ─────────────────────────────────────────────────────────
+class ActivityDetector:
+    """
+    Decides whether the screen changed enough between two checked frames to count as activity.
+    Subclasses implement _compare and keep whatever reference state they need.
+    channel_order is "rgb" or "bgr" (BGRA frames); any alpha channel is ignored.
+    """
+
+    def __init__(self, change_ratio_threshold=0.0035, channel_order="rgb"):
+        self.change_ratio_threshold = change_ratio_threshold
+        self.channel_order = channel_order
+        self.last_stats = {}
+        self._prev = None
+
+    def reset(self):
+        self._prev = None
+        self.last_stats = {}
+
+    def update(self, frame) -> bool:
+        """Compares frame against the previous checked frame. The first frame never counts as activity."""
+        curr = self._prepare(frame)
+        prev, self._prev = self._prev, curr
+        if prev is None or prev.shape != curr.shape:
+            self.last_stats = {}
+            return False
+        self.last_stats = self._compare(prev, curr)
+        return self.last_stats["active"]
+
+    def _prepare(self, frame):
+        raise NotImplementedError
+
+    def _compare(self, prev, curr) -> dict:
+        raise NotImplementedError
+
+
+class MeanGrayDetector(ActivityDetector):
+    """The original full-resolution check: float mean-of-RGB gray, per-pixel abs diff."""
+
+    def __init__(self, pixel_threshold=15, change_ratio_threshold=0.0035, channel_order="rgb"):
+        super().__init__(change_ratio_threshold, channel_order)
+        self.pixel_threshold = pixel_threshold
+
+    def _prepare(self, frame):
+        return frame[..., :3].mean(axis=2)
+
+    def _compare(self, prev, curr) -> dict:
+        change_ratio = float(np.mean(np.abs(curr - prev) > self.pixel_threshold))
+        return {"change_ratio": change_ratio, "active": change_ratio > self.change_ratio_threshold}
+
+
+class LumaBlockDetector(ActivityDetector):
+    """
+    Cheap detector: integer BT.601 luma computed on a strided (downsampled) grid as uint8,
+    then changed-pixel statistics per block. Temporaries are 1/step^2 of the frame and never float.
+
+    A frame counts as activity when the overall changed ratio exceeds change_ratio_threshold,
+    or, if min_changed_blocks is set, when at least that many blocks individually changed by
+    more than block_change_threshold (catches small localized edits such as typing).
+    """
+
+    def __init__(self, step=4, block_size=16, pixel_threshold=15, change_ratio_threshold=0.0035,
+                 block_change_threshold=0.25, min_changed_blocks=None, channel_order="rgb"):
+        super().__init__(change_ratio_threshold, channel_order)
+        self.step = max(1, int(step))
+        self.block_size = max(1, int(block_size))
+        self.pixel_threshold = pixel_threshold
+        self.block_change_threshold = block_change_threshold
+        self.min_changed_blocks = min_changed_blocks
+
+    def _prepare(self, frame):
+        sub = frame[::self.step, ::self.step]
+        r, b = (2, 0) if self.channel_order == "bgr" else (0, 2)
+        # (77 R + 150 G + 29 B) >> 8, accumulated in uint16 to avoid float temporaries
+        luma = sub[..., r].astype(np.uint16) * 77
+        luma += sub[..., 1].astype(np.uint16) * 150
+        luma += sub[..., b].astype(np.uint16) * 29
+        luma >>= 8
+        return luma.astype(np.uint8)
+
+    def _compare(self, prev, curr) -> dict:
+        # |a - b| without leaving uint8
+        diff = np.maximum(prev, curr)
+        diff -= np.minimum(prev, curr)
+        changed = diff > self.pixel_threshold
+        change_ratio = float(changed.mean())
+
+        b = self.block_size
+        bh, bw = changed.shape[0] // b, changed.shape[1] // b
+        if bh and bw:
+            block_counts = changed[:bh * b, :bw * b].reshape(bh, b, bw, b).sum(axis=(1, 3))
+            block_ratios = block_counts / float(b * b)
+            changed_blocks = int((block_ratios > self.block_change_threshold).sum())
+            max_block_ratio = float(block_ratios.max())
+        else:
+            changed_blocks, max_block_ratio = 0, change_ratio
+
+        active = change_ratio > self.change_ratio_threshold
+        if not active and self.min_changed_blocks:
+            active = changed_blocks >= self.min_changed_blocks
+
+        return {
+            "change_ratio": change_ratio,
+            "changed_blocks": changed_blocks,
+            "total_blocks": bh * bw,
+            "max_block_ratio": max_block_ratio,
+            "active": active,
+        }
@@ -0,0 +1,193 @@
+import base64
+import hashlib
+import json
+import os
+import subprocess
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+from encoder import get_ffmpeg_exe
+
+
+def video_signature(video_bytes, samples=8, sample_fps=2, path=None, grid=(128, 80)):
+    """
+    Perceptual signature of an MP4: grid-sized greyscale thumbnails of `samples`
+    frames spread evenly over the video. At 128x80 a cell is about a tenth of a
+    text line's height by a character or two, so an edited line changes cells,
+    while re-encoding moves a cell by a few grey levels at most.
+    Returns an (n, 80, 128) uint8 array, or None if ffmpeg cannot decode it.
+    With path (the same video already on disk), ffmpeg reads that file directly.
+    """
+    if path is None:
+        # A file rather than a pipe: MP4s with the index at the end need seeking
+        with tempfile.NamedTemporaryFile(suffix=".mp4") as f:
+            f.write(video_bytes)
+            f.flush()
+            return video_signature(video_bytes, samples, sample_fps, f.name, grid)
+    width, height = grid
+    try:
+        result = subprocess.run(
+            [get_ffmpeg_exe(), "-v", "error", "-i", path,
+             "-vf", f"fps={sample_fps},scale={width}:{height}:flags=area,format=gray",
+             "-f", "rawvideo", "pipe:1"],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=60,
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    frames = np.frombuffer(result.stdout, dtype=np.uint8)
+    if result.returncode or frames.size < width * height: return None
+    frames = frames[:frames.size - frames.size % (width * height)].reshape(-1, height, width)
+    return frames[np.linspace(0, len(frames) - 1, min(samples, len(frames))).astype(int)]
+
+
+def signature_similarity(a, b, tile=(4, 16), tolerance=16) -> float:
+    """
+    Share of matching cells (within `tolerance` grey levels) in the least alike
+    tile of any sampled frame, so a change confined to one line is not averaged
+    away by the rest of the screen (0 when the signatures cannot be compared).
+    """
+    if a is None or b is None or a.shape != b.shape: return 0.0
+    n, height, width = a.shape
+    rows, cols = tile
+    differing = np.abs(a.astype(np.int16) - b)[:, :height - height % rows, :width - width % cols] > tolerance
+    differing = differing.reshape(n, height // rows, rows, width // cols, cols).mean(axis=(2, 4))
+    return 1.0 - float(differing.max())
+
+
+def _pack_signature(signature):
+    # JSON-safe: each frame stored as its difference to the previous one, mostly 0 on
+    # screen content, so it compresses well
+    deltas = signature.copy()
+    deltas[1:] -= signature[:-1]
+    return {"kind": "thumbnails", "shape": list(signature.shape),
+            "data": base64.b64encode(zlib.compress(deltas.tobytes())).decode()}
+
+
+def _unpack_signature(packed):
+    if not isinstance(packed, dict) or packed.get("kind") != "thumbnails": return None   # none, or an older format
+    deltas = np.frombuffer(zlib.decompress(base64.b64decode(packed["data"])), dtype=np.uint8)
+    return np.cumsum(deltas.reshape(packed["shape"]), axis=0, dtype=np.uint8)
+
+
+# ─────────────────────────────────────────────────────────
+# ANALYSIS RESULT CACHE
+# ─────────────────────────────────────────────────────────
+class AnalysisCache:
+    """
+    Analysis results keyed by video content, so a repeated reproduction is
+    answered without another upload / index / analyze round trip.
+
+    A video hits on an identical SHA-256. With similarity below 1.0 it also
+    hits on a perceptual signature at least that alike, but never on an entry
+    of the same group (e.g. another part of the same recording session, which
+    looks alike but shows different work). Entries are evicted
+    least recently used beyond max_entries and once older than max_age
+    seconds. With a path, the cache is saved there (JSON, atomic replace)
+    after every change and loaded again on start.
+    """
+
+    def __init__(self, path=None, similarity=1.0, max_entries=500, max_age=7 * 86400, metrics=None):
+        self.path = path
+        self.similarity = similarity
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.metrics = metrics
+        self._entries = OrderedDict()   # digest -> entry, least recently used first
+        self._lock = threading.Lock()
+        self._load()
+
+    def get_or_compute(self, video_bytes, compute, path=None, group=None):
+        """
+        Returns the cached analysis for video_bytes (any bytes-like object, e.g. a memory map),
+        or compute(video_bytes) (cached unless None). path: the same video on disk, if it is there.
+        group: any JSON value; near matches within the same group are skipped.
+        """
+        digest = hashlib.sha256(video_bytes).hexdigest()
+        text = self._lookup(digest)
+        if text is not None:
+            self._count("cache_hits_exact")
+            return text
+
+        signature = video_signature(video_bytes, path=path) if self.similarity < 1 else None
+        if signature is not None:
+            text = self._lookup_similar(signature, group)
+            if text is not None:
+                self._count("cache_hits_similar")
+                return text
+
+        self._count("cache_misses")
+        text = compute(video_bytes)
+        if text is not None:
+            self.put(digest, signature, text, group)
+        return text
+
+    def put(self, digest, signature, text, group=None):
+        with self._lock:
+            self._entries[digest] = {
+                "signature": _pack_signature(signature) if signature is not None else None,
+                "group": group,
+                "text": text,
+                "created": time.time(),
+            }
+            self._entries.move_to_end(digest)
+            self._evict()
+            self._save()
+
+    def _lookup(self, digest):
+        with self._lock:
+            self._evict()
+            entry = self._entries.get(digest)
+            if entry is None: return None
+            self._entries.move_to_end(digest)
+            return entry["text"]
+
+    def _lookup_similar(self, signature, group):
+        with self._lock:
+            best, best_score = None, self.similarity
+            for digest, entry in self._entries.items():
+                if group is not None and entry.get("group") == group: continue
+                score = signature_similarity(signature, _unpack_signature(entry["signature"]))
+                if score >= best_score:
+                    best, best_score = digest, score
+            if best is None: return None
+            self._entries.move_to_end(best)
+            return self._entries[best]["text"]
+
+    def _evict(self):
+        cutoff = time.time() - self.max_age if self.max_age else None
+        if cutoff is not None:
+            for digest in [d for d, e in self._entries.items() if e["created"] < cutoff]:
+                del self._entries[digest]
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _count(self, name):
+        if self.metrics is not None:
+            self.metrics.incr(name)
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path): return
+        try:
+            with open(self.path) as f:
+                self._entries = OrderedDict(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"[Engine] Ignoring unreadable analysis cache {self.path}: {e}")
+            return
+        self._evict()
+
+    def _save(self):
+        if not self.path: return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._entries, f)
+        os.replace(tmp_path, self.path)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "similarity": self.similarity, "path": self.path}
@@ -0,0 +1,84 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+
+# ─────────────────────────────────────────────────────────
+# ORDERED ANALYSIS POOL
+# ─────────────────────────────────────────────────────────
+class OrderedWorkerPool:
+    """
+    Runs the blocking fn(item) for up to `workers` items at once on a thread
+    executor and reports the outcomes on the event loop in submission order:
+    await on_result(item, result, error) is called once per item, and a fast
+    job finishing early waits for the ones submitted before it. submit waits
+    while every worker is busy, so callers feel backpressure instead of
+    growing an unbounded backlog. Use from a single event loop.
+    """
+
+    def __init__(self, fn, workers=3, on_result=None, name="analysis"):
+        self.fn = fn
+        self.workers = max(1, int(workers))
+        self.on_result = on_result
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=name)
+        self._slots = asyncio.Semaphore(self.workers)
+        self._last = None           # task of the most recently submitted item
+        self._tasks = set()
+        self._running = 0
+        self._waiting = 0
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+
+    async def submit(self, item):
+        """Starts fn(item) once a worker is free."""
+        await self._slots.acquire()
+        task = asyncio.create_task(self._process(item, self._last))
+        self._last = task
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        self.submitted += 1
+
+    async def _process(self, item, previous):
+        self._running += 1
+        try:
+            result, error = await asyncio.get_running_loop().run_in_executor(self._executor, self.fn, item), None
+        except Exception as e:
+            result, error = None, e
+        finally:
+            self._running -= 1
+            self._slots.release()
+
+        # Report after everything submitted earlier
+        self._waiting += 1
+        try:
+            if previous is not None:
+                await asyncio.wait([previous])
+        finally:
+            self._waiting -= 1
+        if error: self.failed += 1
+        else: self.completed += 1
+        if self.on_result:
+            try:
+                await self.on_result(item, result, error)
+            except Exception as e:
+                print(f"[Engine] Analysis result handler failed: {e}")
+
+    async def aclose(self):
+        """Cancels pending reports and stops the executor (running SDK calls finish in the background)."""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "running": self._running,
+            # Finished, but held back until earlier items report
+            "waiting_to_report": self._waiting,
+            "in_flight": len(self._tasks),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
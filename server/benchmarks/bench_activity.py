@@ -0,0 +1,103 @@
+"""
+Activity detector benchmark.
+
+Measures CPU time and peak temporary allocation per activity check for the
+original full-resolution MeanGrayDetector and the downsampled LumaBlockDetector
+at 1080p, 1440p and 4K.
+
+    python server/benchmarks/bench_activity.py [--checks 50] [--json out.json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+_server_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _server_dir not in sys.path:
+    sys.path.insert(0, _server_dir)
+
+from activity import MeanGrayDetector, LumaBlockDetector
+
+
+RESOLUTIONS = {
+    "1080p": (1080, 1920),
+    "1440p": (1440, 2560),
+    "4K": (2160, 3840),
+}
+
+DETECTORS = {
+    "mean_gray": MeanGrayDetector,
+    "luma_block": LumaBlockDetector,
+}
+
+
+def make_ide_frames(height, width, count, seed=0):
+    """Dark editor background with rows of 'text' that scroll by a line every frame."""
+    rng = np.random.default_rng(seed)
+    line_h = 18
+    page = np.full((height + line_h * count, width, 3), 30, dtype=np.uint8)
+    for y in range(0, page.shape[0] - line_h, line_h):
+        length = int(rng.integers(width // 8, width * 3 // 4))
+        page[y + 4:y + 14, 40:40 + length] = rng.integers(120, 230, size=3, dtype=np.uint8)
+    return [page[i * line_h:i * line_h + height] for i in range(count)]
+
+
+def bench_detector(detector_cls, frames, checks):
+    detector = detector_cls()
+    detector.update(frames[0])
+
+    cpu_times = []
+    wall_times = []
+    tracemalloc.start()
+    peak_bytes = 0
+    for i in range(checks):
+        frame = frames[(i + 1) % len(frames)]
+        tracemalloc.reset_peak()
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        detector.update(frame)
+        wall_times.append(time.perf_counter() - wall_start)
+        cpu_times.append(time.process_time() - cpu_start)
+        peak_bytes = max(peak_bytes, tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+
+    return {
+        "cpu_ms_mean": 1000 * float(np.mean(cpu_times)),
+        "wall_ms_p50": 1000 * float(np.percentile(wall_times, 50)),
+        "wall_ms_p95": 1000 * float(np.percentile(wall_times, 95)),
+        "peak_temp_mb": peak_bytes / 1e6,
+        "last_change_ratio": detector.last_stats.get("change_ratio"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--checks", type=int, default=50, help="activity checks per detector and resolution")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'RESOLUTION':<10} {'DETECTOR':<12} {'CPU ms':>8} {'p50 ms':>8} {'p95 ms':>8} {'TEMP MB':>8}")
+    print("-" * 60)
+    for res_name, (h, w) in RESOLUTIONS.items():
+        frames = make_ide_frames(h, w, count=8)
+        for det_name, det_cls in DETECTORS.items():
+            r = bench_detector(det_cls, frames, args.checks)
+            r.update({"resolution": res_name, "detector": det_name})
+            results.append(r)
+            print(f"{res_name:<10} {det_name:<12} {r['cpu_ms_mean']:>8.2f} {r['wall_ms_p50']:>8.2f} "
+                  f"{r['wall_ms_p95']:>8.2f} {r['peak_temp_mb']:>8.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Pre-encode downscale benchmark.
+
+Renders the same IDE footage (typing, then scrolling) at Retina-class source
+sizes, caps it with FrameScaler at several max dimensions and encodes it with
+the streaming encoder. Shows what each cap costs and saves:
+
+    resize ms     cv2 area resize + colour conversion into a ring slot, per frame
+                  (native: the plain BGRA -> RGB copy it replaces)
+    frame MB      frame ring memory per buffered frame
+    encode s      wall time to capture and encode the clip (start to MP4 bytes)
+    ffmpeg cpu s  encoder CPU time
+    KB            encoded MP4 size (what gets uploaded)
+
+    python server/benchmarks/bench_downscale.py [--frames 100] [--caps 0,2560,1920,1280,960] [--json out.json]
+"""
+
+import argparse
+import json
+import os
+import resource
+import sys
+import time
+
+import numpy as np
+
+_server_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _server_dir not in sys.path:
+    sys.path.insert(0, _server_dir)
+
+from encoder import StreamingEncoder
+from frame_ring import FrameRing
+from frame_source import SyntheticFrameSource
+from scaling import FrameScaler, cv2
+
+
+SOURCES = {
+    "1440p": (1440, 2560),
+    "Retina-16": (2234, 3456),
+    "4K": (2160, 3840),
+}
+
+
+def _children_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _clip(source_size, frames, fps):
+    height, width = source_size
+    half = max(1, frames // (2 * fps))
+    return SyntheticFrameSource(width, height, fps=fps, script=[("typing", half), ("scrolling", half)])
+
+
+def bench_cap(source_size, cap, frames, fps):
+    scaler = FrameScaler(max_dimension=cap or None)
+    ring = FrameRing(1 << 30)
+
+    # Pass 1: resize cost alone (frame rendering excluded, no encoder competing for CPU)
+    source = _clip(source_size, frames, fps)
+    resize_times = []
+    for _ in range(frames):
+        bgra = source.read()
+        h, w = scaler.target_size(*bgra.shape[:2])
+        slot = ring.acquire((h, w, 3))
+        start = time.perf_counter()
+        if (h, w) == bgra.shape[:2]:
+            np.copyto(slot.array, bgra[..., 2::-1])
+        else:
+            scaler.resize_into(bgra, slot.array, to_rgb=True)
+        resize_times.append(time.perf_counter() - start)
+        slot.release()
+
+    # Pass 2: encode the capped clip
+    source = _clip(source_size, frames, fps)
+    encoder = StreamingEncoder(w, h, fps=fps)
+    cpu_start = _children_cpu()
+    encode_start = time.perf_counter()
+    encoder.start()
+    for _ in range(frames):
+        slot = source.grab(ring, scaler=scaler)
+        encoder.write(slot.array)
+        slot.release()
+    video = encoder.finish() or b""
+    encode_seconds = time.perf_counter() - encode_start
+
+    return {
+        "output": f"{w}x{h}",
+        "resize_ms_p50": 1000 * float(np.percentile(resize_times, 50)),
+        "frame_mb": slot.array.nbytes / 1e6,
+        "encode_s": encode_seconds,
+        "ffmpeg_cpu_s": _children_cpu() - cpu_start,
+        "encoded_kb": len(video) / 1e3,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=100, help="frames per clip")
+    parser.add_argument("--fps", type=int, default=10)
+    parser.add_argument("--caps", default="0,2560,1920,1280,960", help="max dimensions to try (0 = native)")
+    parser.add_argument("--sources", default=",".join(SOURCES), help="comma-separated subset of " + ", ".join(SOURCES))
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    if cv2 is None:
+        print("OpenCV not installed: resizing falls back to nearest-neighbour sampling\n")
+
+    results = []
+    print(f"{'SOURCE':<10} {'CAP':>6} {'OUTPUT':>10} {'RESIZE ms':>10} {'FRAME MB':>9} {'ENCODE s':>9} "
+          f"{'FFMPEG CPU s':>13} {'KB':>9}")
+    print("-" * 82)
+    for source_name in args.sources.split(","):
+        for cap in (int(c) for c in args.caps.split(",")):
+            r = bench_cap(SOURCES[source_name], cap, args.frames, args.fps)
+            r.update({"source": source_name, "cap": cap or None})
+            results.append(r)
+            print(f"{source_name:<10} {cap or 'native':>6} {r['output']:>10} {r['resize_ms_p50']:>10.2f} "
+                  f"{r['frame_mb']:>9.1f} {r['encode_s']:>9.2f} {r['ffmpeg_cpu_s']:>13.2f} {r['encoded_kb']:>9.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
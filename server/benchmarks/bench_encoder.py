@@ -0,0 +1,95 @@
+"""
+Encoder profile benchmark.
+
+Encodes the same representative IDE footage (mostly typing and still screens,
+with bursts of scrolling) with each named encoder profile and with plain
+libx264 defaults for reference. Reports:
+
+    encode fps     frames per second of ffmpeg CPU time (how much of a core a profile needs)
+    wall fps       frames per second end to end, including rendering the footage
+    KB/min         encoded size per minute of recording (what gets uploaded)
+
+    python server/benchmarks/bench_encoder.py [--seconds 60] [--size 1920x1080] [--fps 10] [--json out.json]
+"""
+
+import argparse
+import json
+import os
+import resource
+import sys
+import time
+
+_server_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _server_dir not in sys.path:
+    sys.path.insert(0, _server_dir)
+
+from encoder import ENCODER_PROFILES, StreamingEncoder
+from frame_ring import FrameRing
+from frame_source import SyntheticFrameSource
+
+
+# libx264 with nothing set, as the recorder used to encode
+BASELINE = {"preset": None, "crf": None, "tune": None, "keyframe_seconds": None, "pix_fmt": "yuv420p"}
+
+IDE_SCRIPT = [("typing", 8), ("idle", 4), ("scrolling", 2), ("typing", 5), ("idle", 6)]
+
+
+def _children_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def bench_profile(profile, width, height, fps, seconds):
+    source = SyntheticFrameSource(width, height, fps=fps, script=IDE_SCRIPT)
+    ring = FrameRing(64 * 1024 * 1024)
+    frames = int(seconds * fps)
+
+    encoder = StreamingEncoder(width, height, fps=fps, profile=profile)
+    cpu_start = _children_cpu()
+    wall_start = time.perf_counter()
+    encoder.start()
+    for _ in range(frames):
+        slot = source.grab(ring)
+        encoder.write(slot.array)
+        slot.release()
+    video = encoder.finish() or b""
+    wall = time.perf_counter() - wall_start
+    cpu = _children_cpu() - cpu_start
+
+    return {
+        "frames": frames,
+        "encode_fps": frames / cpu if cpu else None,
+        "wall_fps": frames / wall,
+        "kb_per_minute": len(video) / 1e3 / (seconds / 60),
+        "bytes": len(video),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=60, help="seconds of footage per profile")
+    parser.add_argument("--size", default="1920x1080")
+    parser.add_argument("--fps", type=int, default=10)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+    width, _, height = args.size.partition("x")
+    width, height = int(width), int(height)
+
+    profiles = {"x264-default": BASELINE, **ENCODER_PROFILES}
+    results = []
+    print(f"{'PROFILE':<14} {'ENCODE fps':>11} {'WALL fps':>9} {'KB/min':>9}")
+    print("-" * 46)
+    for name, profile in profiles.items():
+        r = bench_profile(profile, width, height, args.fps, args.seconds)
+        r.update({"profile": name, "size": args.size, "fps": args.fps})
+        results.append(r)
+        print(f"{name:<14} {r['encode_fps'] or 0:>11.1f} {r['wall_fps']:>9.1f} {r['kb_per_minute']:>9.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
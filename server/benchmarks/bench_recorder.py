@@ -0,0 +1,311 @@
+"""
+End-to-end recorder benchmark.
+
+Drives IdleScreenRecorder and the streaming encoder with the synthetic frame
+source through scripted workloads (idle, typing, scrolling, full-screen video)
+at several resolutions and frame rates. Each workload records for a few active
+seconds and then goes idle, so exactly one session is cut off and encoded.
+
+Reported per run:
+    achieved fps          captured frames / capture seconds (vs the target fps; idle
+                          stretches are probed at --idle-probe-fps)
+    stage latencies       p50 / p95 / max ms of capture, detect, cursor and encode
+                          (encode = one frame into the ffmpeg pipe), plus frame age
+                          when it reaches the encoder, capture slot lateness and
+                          skipped slots from the frame scheduler
+    peak RSS              the recorder process and its ffmpeg encoder (Linux only), in MB
+    encoded bytes/s       MP4 bytes per second of recording
+    ready ms              idle cutoff -> MP4 bytes ready
+
+Every run happens in a fresh subprocess so peak RSS is per run.
+
+    python server/benchmarks/bench_recorder.py [--workloads typing,video] [--resolutions 720p,1080p]
+        [--fps 10,30] [--pixel-format rgb24|bgra] [--json out.json] [--compare baseline.json]
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+_server_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _server_dir not in sys.path:
+    sys.path.insert(0, _server_dir)
+
+from activity import LumaBlockDetector
+from frame_source import SyntheticFrameSource
+from pipeline import VideoChannel
+from video_engine import IdleScreenRecorder
+
+
+RESOLUTIONS = {
+    "720p": (720, 1280),
+    "1080p": (1080, 1920),
+    "1440p": (1440, 2560),
+    "4K": (2160, 3840),
+}
+
+WORKLOADS = ("idle", "typing", "scrolling", "video")
+
+# Recorder methods timed per call, by report name
+STAGES = {
+    "capture": "_capture_frame",
+    "detect": "_check_visual_activity",
+    "cursor": "_composite_cursor",
+    "encode": "_store_frame",
+    "finalize": "_finish_session",
+}
+
+# Metrics shown by --compare, with the direction that counts as better
+COMPARED = {
+    "achieved_fps": "higher",
+    "encode_ms_p95": "lower",
+    "peak_rss_mb": "lower",
+    "encoded_bytes_per_s": "lower",
+    "ready_ms": "lower",
+}
+# Changes in the wrong direction beyond this are flagged with "!"
+REGRESSION_PCT = 10
+
+
+def _timed(method, samples):
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            samples.append(time.perf_counter() - start)
+    return wrapper
+
+
+def _percentiles(samples):
+    if not samples:
+        return {"p50": None, "p95": None, "max": None, "count": 0}
+    ms = 1000 * np.asarray(samples)
+    return {
+        "p50": round(float(np.percentile(ms, 50)), 3),
+        "p95": round(float(np.percentile(ms, 95)), 3),
+        "max": round(float(ms.max()), 3),
+        "count": len(samples),
+    }
+
+
+def _peak_rss_mb():
+    # ru_maxrss is kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1e6 if sys.platform == "darwin" else 1e3)
+
+
+def _ffmpeg_peak_mb(recorder):
+    """High-water RSS of the running ffmpeg encoder, read from /proc (None elsewhere)."""
+    proc = getattr(recorder._encoder, "_proc", None)
+    if proc is None: return None
+    try:
+        with open(f"/proc/{proc.pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1e3
+    except OSError:
+        return None
+
+
+def run_workload(workload, resolution, fps, active_seconds, idle_seconds, pixel_format, quiet=True,
+                 idle_probe_fps=2, cpu_budget=None):
+    """Records one scripted session and returns its measurements."""
+    height, width = RESOLUTIONS[resolution]
+    if workload == "idle":
+        script = [("idle", active_seconds + idle_seconds)]
+    else:
+        # Active phase, then a still screen long enough for the idle cutoff
+        script = [(workload, active_seconds), ("idle", 3600)]
+    # Real-time playback: content keeps changing at fps even when the recorder probes slower
+    source = SyntheticFrameSource(width, height, fps=fps, script=script, realtime=True)
+
+    channel_order = "bgr" if pixel_format == "bgra" else "rgb"
+    # Single changed blocks count as activity so typing keeps the session alive
+    detector = LumaBlockDetector(min_changed_blocks=1, block_change_threshold=0.1, channel_order=channel_order)
+    recorder = IdleScreenRecorder(idle_seconds=idle_seconds, fps=fps, source=source, activity_detector=detector,
+                                  pixel_format=pixel_format, idle_probe_fps=idle_probe_fps, cpu_budget=cpu_budget)
+
+    samples = {name: [] for name in STAGES}
+    for name, attr in STAGES.items():
+        setattr(recorder, attr, _timed(getattr(recorder, attr), samples[name]))
+    frame_age = []
+    store = recorder._store_frame
+    def store_frame(frame):
+        frame_age.append(time.monotonic() - frame.timestamp)
+        return store(frame)
+    recorder._store_frame = store_frame
+    ffmpeg_peak = []
+    finish = recorder._finish_session
+    def finish_session():
+        ffmpeg_peak.append(_ffmpeg_peak_mb(recorder))
+        return finish()
+    recorder._finish_session = finish_session
+
+    channel = VideoChannel(max_videos=1000, max_bytes=None)
+    out = open(os.devnull, "w") if quiet else sys.stdout
+    with contextlib.redirect_stdout(out):
+        thread = threading.Thread(target=recorder.record_until_idle, args=(channel,), daemon=True)
+        start = time.monotonic()
+        thread.start()
+        # Wait for the idle cutoff and the finished MP4 (or just the scripted time when idle)
+        deadline = start + active_seconds + idle_seconds + 10
+        run_until = start + active_seconds + idle_seconds + 1
+        while time.monotonic() < deadline:
+            if workload != "idle" and recorder.session_log: break
+            if workload == "idle" and time.monotonic() >= run_until: break
+            time.sleep(0.05)
+        recorder.stop()
+        capture_seconds = time.monotonic() - start
+        thread.join()
+    if quiet:
+        out.close()
+
+    captured = samples["capture"]
+    videos = channel.drain()
+    encoded_bytes = sum(len(v) for v in videos)
+    session = recorder.session_log[0] if recorder.session_log else {}
+    stats = recorder.get_pipeline_stats()
+    result = {
+        "workload": workload,
+        "resolution": resolution,
+        "fps": fps,
+        "pixel_format": pixel_format,
+        "achieved_fps": round(len(captured) / capture_seconds, 2),
+        "frames_captured": len(captured),
+        "frames_encoded": session.get("frames", 0),
+        "duplicate_frames": recorder.duplicate_frames,
+        "dropped_frames": sum(stats[q]["dropped"] for q in ("detect", "encode")),
+        "videos": len(videos),
+        "encoded_bytes": encoded_bytes,
+        "encoded_bytes_per_s": round(encoded_bytes / capture_seconds),
+        "ready_ms": round(1000 * session["ready_seconds"], 1) if session.get("ready_seconds") is not None else None,
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "peak_ffmpeg_rss_mb": max((mb for mb in ffmpeg_peak if mb is not None), default=None),
+        "stages_ms": {name: _percentiles(values) for name, values in samples.items()},
+        "frame_age_ms": _percentiles(frame_age),
+        "scheduler": recorder._scheduler.stats(),
+        "governor": recorder._governor.stats(),
+        "capture_lateness_ms": recorder.metrics.histogram("capture_lateness").snapshot(),
+    }
+    result["encode_ms_p95"] = result["stages_ms"]["encode"]["p95"]
+    source.close()
+    return result
+
+
+def _run_isolated(args, workload, resolution, fps):
+    cmd = [sys.executable, os.path.abspath(__file__), "--single", workload, resolution, str(fps),
+           "--active-seconds", str(args.active_seconds), "--idle-seconds", str(args.idle_seconds),
+           "--pixel-format", args.pixel_format, "--idle-probe-fps", str(args.idle_probe_fps)]
+    if args.cpu_budget:
+        cmd += ["--cpu-budget", str(args.cpu_budget)]
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{workload} {resolution} {fps}fps failed:\n{proc.stderr}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _metadata():
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=_server_dir,
+                                         stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def _key(r):
+    return r["workload"], r["resolution"], r["fps"], r["pixel_format"]
+
+
+def compare(baseline, results):
+    """Prints relative change of the headline metrics against a previous --json file."""
+    before = {_key(r): r for r in baseline["results"]}
+    print(f"\nCompared with {baseline['meta'].get('commit') or 'baseline'}:")
+    print(f"{'WORKLOAD':<10} {'RES':<6} {'FPS':>4} " + " ".join(f"{m:>20}" for m in COMPARED))
+    for r in results:
+        old = before.get(_key(r))
+        if old is None: continue
+        cells = []
+        for metric, better in COMPARED.items():
+            a, b = old.get(metric), r.get(metric)
+            if not a or b is None:
+                cells.append(f"{'-':>20}")
+                continue
+            change = (b - a) / a * 100
+            worse = change < -REGRESSION_PCT if better == "higher" else change > REGRESSION_PCT
+            cells.append(f"{change:>+18.1f}%{'!' if worse else ' '}")
+        print(f"{r['workload']:<10} {r['resolution']:<6} {r['fps']:>4} " + " ".join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workloads", default=",".join(WORKLOADS), help="comma-separated subset of " + ", ".join(WORKLOADS))
+    parser.add_argument("--resolutions", default="720p,1080p,1440p", help="comma-separated subset of " + ", ".join(RESOLUTIONS))
+    parser.add_argument("--fps", default="10,30", help="comma-separated target frame rates")
+    parser.add_argument("--active-seconds", type=float, default=5, help="seconds of activity before the screen goes still")
+    parser.add_argument("--idle-seconds", type=float, default=3, help="recorder idle cutoff (activity is checked once a second, keep it >= 3)")
+    parser.add_argument("--pixel-format", default="rgb24", choices=("rgb24", "bgra"))
+    parser.add_argument("--idle-probe-fps", type=float, default=2, help="capture rate while idle (0 = always full rate)")
+    parser.add_argument("--cpu-budget", type=float, help="recorder CPU budget in cores for the capture governor")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="previous --json output to compare against")
+    parser.add_argument("--in-process", action="store_true", help="run everything in this process (RSS is cumulative)")
+    parser.add_argument("--single", nargs=3, metavar=("WORKLOAD", "RESOLUTION", "FPS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        workload, resolution, fps = args.single
+        r = run_workload(workload, resolution, int(fps), args.active_seconds, args.idle_seconds, args.pixel_format,
+                         idle_probe_fps=args.idle_probe_fps, cpu_budget=args.cpu_budget)
+        print(json.dumps(r))
+        return
+
+    results = []
+    print(f"{'WORKLOAD':<10} {'RES':<6} {'FPS':>4} {'ACHIEVED':>9} {'CAP p95':>8} {'DET p95':>8} "
+          f"{'ENC p95':>8} {'AGE p95':>8} {'RSS MB':>7} {'FFMPEG':>7} {'KB/s':>8} {'READY ms':>9}")
+    print("-" * 110)
+    for workload in args.workloads.split(","):
+        for resolution in args.resolutions.split(","):
+            for fps in (int(f) for f in args.fps.split(",")):
+                if args.in_process:
+                    r = run_workload(workload, resolution, fps, args.active_seconds, args.idle_seconds,
+                                     args.pixel_format, idle_probe_fps=args.idle_probe_fps, cpu_budget=args.cpu_budget)
+                else:
+                    r = _run_isolated(args, workload, resolution, fps)
+                results.append(r)
+                stages = r["stages_ms"]
+                ready = f"{r['ready_ms']:.0f}" if r["ready_ms"] is not None else "-"
+                print(f"{workload:<10} {resolution:<6} {fps:>4} {r['achieved_fps']:>9.1f} "
+                      f"{stages['capture']['p95'] or 0:>8.2f} {stages['detect']['p95'] or 0:>8.2f} "
+                      f"{stages['encode']['p95'] or 0:>8.2f} {r['frame_age_ms']['p95'] or 0:>8.1f} "
+                      f"{r['peak_rss_mb']:>7.0f} {r['peak_ffmpeg_rss_mb'] or 0:>7.0f} "
+                      f"{r['encoded_bytes_per_s'] / 1e3:>8.1f} {ready:>9}")
+
+    report = {"meta": _metadata(), "results": results}
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.json}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
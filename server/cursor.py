@@ -0,0 +1,209 @@
+import threading
+import time
+from array import array
+from bisect import bisect_right
+
+import numpy as np
+
+
+# Triangle cursor geometry relative to the hotspot: top, bottom left, bottom right
+CURSOR_TRIANGLE = [(0, 0), (-8, 18), (8, 18)]
+
+# Click-state colours used by the recorder (see IdleScreenRecorder._on_mouse_click)
+CURSOR_COLORS = {
+    "white": (255, 255, 255),
+    "#00FF00": (0, 255, 0),
+    "#FF0000": (255, 0, 0),
+    "blue": (0, 0, 255),
+}
+
+
+def _parse_color(color):
+    if isinstance(color, tuple):
+        return color
+    if color in CURSOR_COLORS:
+        return CURSOR_COLORS[color]
+    if isinstance(color, str) and color.startswith("#") and len(color) == 7:
+        return tuple(int(color[i:i + 2], 16) for i in (1, 3, 5))
+    raise ValueError(f"Unknown cursor color '{color}'")
+
+
+def _rasterize_convex(points):
+    """Returns (mask, x0, y0): a boolean fill mask for a convex polygon and its top-left offset."""
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    x0, y0 = min(xs), min(ys)
+    gy, gx = np.mgrid[y0:max(ys) + 1, x0:max(xs) + 1]
+
+    inside = np.ones(gx.shape, dtype=bool)
+    # Same side of every edge as the polygon's centroid (pixels on an edge count as inside)
+    cx, cy = sum(xs) / len(xs), sum(ys) / len(ys)
+    for (ax, ay), (bx, by) in zip(points, points[1:] + points[:1]):
+        side = (bx - ax) * (gy - ay) - (by - ay) * (gx - ax)
+        ref = (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+        inside &= side * ref >= 0
+    return inside, x0, y0
+
+
+class CursorSprite:
+    """Precomputed cursor pixels: RGB colour image, coverage mask and hotspot offset."""
+
+    def __init__(self, fill, outline=(0, 0, 0), points=CURSOR_TRIANGLE, channel_order="rgb"):
+        mask, self.offset_x, self.offset_y = _rasterize_convex(points)
+
+        # One-pixel outline: filled pixels with a 4-neighbour outside the shape
+        padded = np.pad(mask, 1)
+        interior = mask & padded[:-2, 1:-1] & padded[2:, 1:-1] & padded[1:-1, :-2] & padded[1:-1, 2:]
+
+        pixels = np.zeros((*mask.shape, 3), dtype=np.uint8)
+        pixels[mask] = outline
+        pixels[interior] = fill
+        if channel_order == "bgr":
+            pixels = pixels[:, :, ::-1].copy()
+
+        self.mask = mask
+        self.pixels = pixels
+        self.height, self.width = mask.shape
+
+
+# ─────────────────────────────────────────────────────────
+# CURSOR COMPOSITOR
+# ─────────────────────────────────────────────────────────
+class CursorCompositor:
+    """
+    Paints the cursor straight into a frame in place, touching only the sprite's
+    bounding box. One sprite per click colour is built once and reused.
+    """
+
+    def __init__(self, points=CURSOR_TRIANGLE, channel_order="rgb"):
+        self.points = points
+        self.channel_order = channel_order
+        self._sprites = {}
+
+    def sprite(self, color) -> CursorSprite:
+        sprite = self._sprites.get(color)
+        if sprite is None:
+            sprite = CursorSprite(_parse_color(color), points=self.points, channel_order=self.channel_order)
+            self._sprites[color] = sprite
+        return sprite
+
+    def draw(self, frame, x, y, color) -> bool:
+        """Blits the cursor with its hotspot at (x, y). Returns False if it falls outside the frame."""
+        height, width = frame.shape[:2]
+        if not (0 <= x < width and 0 <= y < height):
+            return False
+        return self.blit(frame, x, y, color)
+
+    def rows_spanned(self, y, color):
+        """Frame rows [top, bottom) the sprite covers with its hotspot on row y."""
+        sprite = self.sprite(color)
+        top = y + sprite.offset_y
+        return top, top + sprite.height
+
+    def blit(self, frame, x, y, color) -> bool:
+        """Blits the sprite clipped to frame, without requiring the hotspot to be inside it."""
+        sprite = self.sprite(color)
+        height, width = frame.shape[:2]
+        left, top = x + sprite.offset_x, y + sprite.offset_y
+        # Clip the sprite box to the frame
+        sx0, sy0 = max(0, -left), max(0, -top)
+        sx1, sy1 = min(sprite.width, width - left), min(sprite.height, height - top)
+        if sx0 >= sx1 or sy0 >= sy1:
+            return False
+
+        region = frame[top + sy0:top + sy1, left + sx0:left + sx1, :3]
+        np.copyto(region, sprite.pixels[sy0:sy1, sx0:sx1], where=sprite.mask[sy0:sy1, sx0:sx1, None])
+        return True
+
+
+# ─────────────────────────────────────────────────────────
+# WINDOW GEOMETRY CACHE
+# ─────────────────────────────────────────────────────────
+class WindowBoundsCache:
+    """
+    Caches the target window's on-screen origin so the capture loop does not query
+    the window server every frame. lookup() is called again once refresh_interval
+    has passed, or right away after invalidate() (e.g. when the window moves or resizes).
+    """
+
+    def __init__(self, lookup, refresh_interval=0.5):
+        self.lookup = lookup
+        self.refresh_interval = refresh_interval
+        self.refreshes = 0
+        self._origin = None
+        self._fetched_at = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._fetched_at = None
+
+    def get(self):
+        """Returns the cached (x, y) window origin, or None if the window cannot be found."""
+        now = time.monotonic()
+        with self._lock:
+            if self._fetched_at is not None and now - self._fetched_at < self.refresh_interval:
+                return self._origin
+        origin = self.lookup()
+        with self._lock:
+            self._origin = origin
+            self._fetched_at = now
+            self.refreshes += 1
+        return origin
+
+
+# ─────────────────────────────────────────────────────────
+# CURSOR TRACK (for compositing at encode time)
+# ─────────────────────────────────────────────────────────
+class CursorTrack:
+    """
+    Compact timestamped log of cursor position (in frame coordinates) and click colour.
+    Stored in typed arrays (about 17 bytes per sample), so capture only records a
+    sample and the cursor is painted later, when the frame is encoded.
+    """
+
+    def __init__(self):
+        self._timestamps = array("d")
+        self._xs = array("i")
+        self._ys = array("i")
+        self._colors = array("B")
+        self._palette = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._timestamps)
+
+    @property
+    def nbytes(self) -> int:
+        with self._lock:
+            return sum(a.itemsize * len(a) for a in (self._timestamps, self._xs, self._ys, self._colors))
+
+    def record(self, timestamp, x, y, color):
+        with self._lock:
+            if color not in self._palette:
+                self._palette.append(color)
+            # Samples normally arrive in order; keep the arrays sorted if one does not
+            i = len(self._timestamps)
+            if i and timestamp < self._timestamps[-1]:
+                i = bisect_right(self._timestamps, timestamp)
+            self._timestamps.insert(i, timestamp)
+            self._xs.insert(i, int(x))
+            self._ys.insert(i, int(y))
+            self._colors.insert(i, self._palette.index(color))
+
+    def sample_at(self, timestamp):
+        """Returns (x, y, color) of the latest sample at or before timestamp, or None."""
+        with self._lock:
+            i = bisect_right(self._timestamps, timestamp) - 1
+            if i < 0:
+                return None
+            return self._xs[i], self._ys[i], self._palette[self._colors[i]]
+
+    def discard_before(self, timestamp):
+        """Drops samples no frame can need any more, keeping the one in effect at timestamp."""
+        with self._lock:
+            i = bisect_right(self._timestamps, timestamp) - 1
+            if i > 0:
+                for a in (self._timestamps, self._xs, self._ys, self._colors):
+                    del a[:i]
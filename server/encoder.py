@@ -0,0 +1,348 @@
+import os
+import struct
+import subprocess
+import threading
+from io import BytesIO
+
+import numpy as np
+
+try:
+    import imageio_ffmpeg
+except ImportError:
+    imageio_ffmpeg = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def get_ffmpeg_exe() -> str:
+    """Returns the ffmpeg binary bundled with imageio[ffmpeg], or the one on PATH."""
+    if imageio_ffmpeg is not None:
+        try:
+            return imageio_ffmpeg.get_ffmpeg_exe()
+        except Exception:
+            pass
+    return "ffmpeg"
+
+
+# ─────────────────────────────────────────────────────────
+# TIMESTAMPED RAW INPUT (minimal Matroska muxer)
+# ─────────────────────────────────────────────────────────
+# Plain rawvideo on stdin has no timestamps, so for variable frame rate the raw
+# frames are wrapped in a streaming Matroska container (unknown-size Segment and
+# Clusters, one SimpleBlock per frame at millisecond precision). ffmpeg demuxes
+# it without transcoding and keeps each frame's real capture time.
+
+# FourCCs ffmpeg maps back to raw pixel formats for V_UNCOMPRESSED tracks
+_MKV_FOURCC = {
+    "rgb24": b"RGB\x18",
+    "bgr24": b"BGR\x18",
+    "bgra": b"BGRA",
+    "rgba": b"RGBA",
+}
+_UNKNOWN_SIZE = b"\x01\xff\xff\xff\xff\xff\xff\xff"
+_MAX_CLUSTER_SPAN_MS = 30000  # SimpleBlock timecodes are int16 relative to the cluster
+
+
+def _ebml_size(n) -> bytes:
+    """Encodes a size as an 8-byte EBML vint (always valid, no length search)."""
+    return b"\x01" + n.to_bytes(7, "big")
+
+
+def _ebml(element_id, payload) -> bytes:
+    return element_id + _ebml_size(len(payload)) + payload
+
+
+def _ebml_uint(element_id, value) -> bytes:
+    return _ebml(element_id, value.to_bytes(max(1, (value.bit_length() + 7) // 8), "big"))
+
+
+class MatroskaRawWriter:
+    """Writes timestamped raw frames as a streaming Matroska V_UNCOMPRESSED track."""
+
+    def __init__(self, stream, width, height, pix_fmt="rgb24"):
+        if pix_fmt not in _MKV_FOURCC:
+            raise ValueError(f"No Matroska FourCC for pixel format '{pix_fmt}'")
+        self.stream = stream
+        self.width = width
+        self.height = height
+        self.pix_fmt = pix_fmt
+        self._cluster_ms = None
+
+    def write_header(self):
+        ebml_header = _ebml(b"\x1a\x45\xdf\xa3",
+            _ebml_uint(b"\x42\x86", 1)               # EBMLVersion
+            + _ebml_uint(b"\x42\xf7", 1)             # EBMLReadVersion
+            + _ebml_uint(b"\x42\xf2", 4)             # EBMLMaxIDLength
+            + _ebml_uint(b"\x42\xf3", 8)             # EBMLMaxSizeLength
+            + _ebml(b"\x42\x82", b"matroska")        # DocType
+            + _ebml_uint(b"\x42\x87", 4)             # DocTypeVersion
+            + _ebml_uint(b"\x42\x85", 2))            # DocTypeReadVersion
+        info = _ebml(b"\x15\x49\xa9\x66",
+            _ebml_uint(b"\x2a\xd7\xb1", 1000000)    # TimestampScale: 1 ms
+            + _ebml(b"\x4d\x80", b"video_engine")    # MuxingApp
+            + _ebml(b"\x57\x41", b"video_engine"))   # WritingApp
+        video = _ebml(b"\xe0",
+            _ebml_uint(b"\xb0", self.width)           # PixelWidth
+            + _ebml_uint(b"\xba", self.height)        # PixelHeight
+            + _ebml(b"\x2e\xb5\x24", _MKV_FOURCC[self.pix_fmt]))  # ColourSpace
+        tracks = _ebml(b"\x16\x54\xae\x6b", _ebml(b"\xae",
+            _ebml_uint(b"\xd7", 1)                    # TrackNumber
+            + _ebml_uint(b"\x73\xc5", 1)             # TrackUID
+            + _ebml_uint(b"\x83", 1)                  # TrackType: video
+            + _ebml(b"\x86", b"V_UNCOMPRESSED")       # CodecID
+            + video))
+        segment = b"\x18\x53\x80\x67" + _UNKNOWN_SIZE
+        self.stream.write(ebml_header + segment + info + tracks)
+
+    def write_frame(self, chunks, timestamp_ms):
+        """Writes one frame given as a list of buffers that together make up its raw bytes."""
+        if self._cluster_ms is None or timestamp_ms - self._cluster_ms > _MAX_CLUSTER_SPAN_MS:
+            self._cluster_ms = timestamp_ms
+            self.stream.write(b"\x1f\x43\xb6\x75" + _UNKNOWN_SIZE + _ebml_uint(b"\xe7", timestamp_ms))
+        # SimpleBlock: track 1, int16 timecode relative to the cluster, keyframe flag
+        block_header = b"\x81" + struct.pack(">hB", timestamp_ms - self._cluster_ms, 0x80)
+        size = len(block_header) + sum(memoryview(c).nbytes for c in chunks)
+        self.stream.write(b"\xa3" + _ebml_size(size) + block_header)
+        for chunk in chunks:
+            self.stream.write(chunk)
+
+
+# ─────────────────────────────────────────────────────────
+# ENCODER PROFILES
+# ─────────────────────────────────────────────────────────
+# x264 settings tuned for screen content (flat areas, sharp text, little motion).
+# keyframe_seconds becomes a GOP length in frames. On mostly static screens the
+# keyframes are the bulk of the file, so long GOPs are the biggest size win.
+ENCODER_PROFILES = {
+    # Quick to encode and to upload: the default for cloud analysis
+    "fast-upload": {"preset": "veryfast", "crf": 30, "tune": "stillimage", "keyframe_seconds": 30, "pix_fmt": "yuv420p"},
+    # Smallest files for slow links, at a higher encode cost
+    "small": {"preset": "slow", "crf": 34, "tune": "stillimage", "keyframe_seconds": 60, "pix_fmt": "yuv420p"},
+    # Near-lossless with full-resolution chroma (crisp coloured text); not every player handles yuv444
+    "archival": {"preset": "medium", "crf": 16, "tune": "stillimage", "keyframe_seconds": 5, "pix_fmt": "yuv444p"},
+}
+DEFAULT_PROFILE = "fast-upload"
+
+
+def resolve_profile(profile) -> dict:
+    """Returns the settings for a profile name, or the dict itself; None means DEFAULT_PROFILE."""
+    if isinstance(profile, dict):
+        return profile
+    name = profile or DEFAULT_PROFILE
+    if name not in ENCODER_PROFILES:
+        raise ValueError(f"Unknown encoder profile '{name}', expected one of {tuple(ENCODER_PROFILES)}")
+    return ENCODER_PROFILES[name]
+
+
+def profile_args(profile, fps) -> list:
+    """x264 output arguments (without -pix_fmt) for a profile at the given frame rate."""
+    settings = resolve_profile(profile)
+    args = []
+    if settings.get("preset"): args += ["-preset", settings["preset"]]
+    if settings.get("tune"): args += ["-tune", settings["tune"]]
+    if settings.get("crf") is not None: args += ["-crf", str(settings["crf"])]
+    if settings.get("keyframe_seconds"):
+        args += ["-g", str(max(1, int(round(settings["keyframe_seconds"] * fps))))]
+    return args
+
+
+# ─────────────────────────────────────────────────────────
+# STREAMING ENCODER (long-lived ffmpeg pipe)
+# ─────────────────────────────────────────────────────────
+class StreamingEncoder:
+    """
+    Feeds raw frames into a long-lived ffmpeg/libx264 process as they are captured.
+    The MP4 is written as fragmented MP4 to stdout so it can be produced without
+    seeking, and a reader thread drains it into RAM while recording continues.
+
+    With vfr=True every frame is written with its capture timestamp (seconds, any
+    monotonic clock) and the MP4 keeps those real timings, so unchanged frames can
+    simply be skipped. Otherwise frames are laid out at a constant fps.
+
+    input_size=(w, h) describes the raw buffers when they are larger than the output,
+    e.g. native BGRA capture buffers with row padding: they are piped as-is and
+    ffmpeg crops them to width x height and converts the colour itself.
+
+    profile is an ENCODER_PROFILES name (or a dict of the same settings).
+    """
+
+    def __init__(self, width, height, fps=10, codec="libx264", input_pix_fmt="rgb24", vfr=False, input_size=None,
+                 profile=None):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.codec = codec
+        self.input_pix_fmt = input_pix_fmt
+        self.vfr = vfr
+        self.input_width, self.input_height = input_size or (width, height)
+        self.profile = resolve_profile(profile)
+        self.output_pix_fmt = self.profile.get("pix_fmt", "yuv420p")
+
+        self._mkv = None
+        self._first_timestamp = None
+        self._last_ms = -1
+
+        self.frames_written = 0
+        self.frames_rejected = 0
+        self._proc = None
+        self._output = BytesIO()
+        self._reader = None
+        self._stderr = b""
+
+    def _build_command(self):
+        if self.vfr:
+            input_args = ["-f", "matroska", "-i", "-"]
+            timing_args = ["-fps_mode", "passthrough", "-video_track_timescale", "1000"]
+        else:
+            input_args = [
+                "-f", "rawvideo",
+                "-pix_fmt", self.input_pix_fmt,
+                "-s", f"{self.input_width}x{self.input_height}",
+                "-r", str(self.fps),
+                "-i", "-",
+            ]
+            timing_args = []
+        filter_args = []
+        if (self.input_width, self.input_height) != (self.width, self.height):
+            filter_args = ["-vf", f"crop={self.width}:{self.height}:0:0"]
+        return [
+            get_ffmpeg_exe(),
+            "-hide_banner", "-loglevel", "error",
+            *input_args,
+            "-an",
+            *filter_args,
+            "-c:v", self.codec,
+            *profile_args(self.profile, self.fps),
+            "-pix_fmt", self.output_pix_fmt,
+            *timing_args,
+            "-movflags", "frag_keyframe+empty_moov+default_base_moof",
+            "-f", "mp4",
+            "-",
+        ]
+
+    def _drain_stdout(self, stdout):
+        while True:
+            chunk = stdout.read(1 << 16)
+            if not chunk:
+                break
+            self._output.write(chunk)
+
+    @property
+    def is_open(self) -> bool:
+        return self._proc is not None
+
+    @property
+    def buffered_bytes(self) -> int:
+        """MP4 bytes received from ffmpeg so far."""
+        return self._output.tell()
+
+    def cpu_seconds(self) -> float:
+        """CPU time the running ffmpeg process has used so far (0 when not running or unknown)."""
+        proc = self._proc
+        if proc is None: return 0.0
+        try:
+            if psutil is not None:
+                times = psutil.Process(proc.pid).cpu_times()
+                return times.user + times.system
+            with open(f"/proc/{proc.pid}/stat") as f:
+                # utime and stime, in clock ticks, follow the parenthesised command name
+                fields = f.read().rsplit(")", 1)[1].split()
+            return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        except Exception:
+            return 0.0
+
+    def start(self):
+        if self._proc is not None: return
+        self._proc = subprocess.Popen(
+            self._build_command(),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        self._reader = threading.Thread(target=self._drain_stdout, args=(self._proc.stdout,), daemon=True)
+        self._reader.start()
+        if self.vfr:
+            self._mkv = MatroskaRawWriter(self._proc.stdin, self.input_width, self.input_height, self.input_pix_fmt)
+            self._mkv.write_header()
+
+    def write(self, frame, timestamp=None, patch=None) -> bool:
+        """
+        Pipes one raw frame (input_size) to ffmpeg. Frames with a different size than the stream are rejected.
+        In VFR mode timestamp is the capture time in seconds; frames must arrive in order.
+        patch=(first_row, rows) substitutes those rows on the way out, so a read-only
+        buffer can carry an overlay without copying the whole frame.
+        """
+        if self._proc is None:
+            self.start()
+        h, w = frame.shape[:2]
+        if h != self.input_height or w != self.input_width:
+            self.frames_rejected += 1
+            return False
+        try:
+            data = memoryview(np.ascontiguousarray(frame)).cast("B")
+            if patch is None:
+                chunks = [data]
+            else:
+                first_row, rows = patch
+                row_bytes = data.nbytes // h
+                chunks = [
+                    data[:first_row * row_bytes],
+                    memoryview(np.ascontiguousarray(rows)).cast("B"),
+                    data[(first_row + len(rows)) * row_bytes:],
+                ]
+            if self._mkv is not None:
+                self._mkv.write_frame(chunks, self._timestamp_ms(timestamp))
+            else:
+                for chunk in chunks:
+                    self._proc.stdin.write(chunk)
+        except (BrokenPipeError, ValueError) as e:
+            print(f"[Encoder] Pipe Error: {e}")
+            return False
+        self.frames_written += 1
+        return True
+
+    def _timestamp_ms(self, timestamp) -> int:
+        if timestamp is None:
+            # No capture time: fall back to the nominal constant-rate slot
+            ms = int(round(self.frames_written * 1000 / self.fps))
+        else:
+            if self._first_timestamp is None:
+                self._first_timestamp = timestamp
+            ms = int(round((timestamp - self._first_timestamp) * 1000))
+        # Keep timestamps strictly increasing at millisecond precision
+        ms = max(ms, self._last_ms + 1)
+        self._last_ms = ms
+        return ms
+
+    def finish(self):
+        """Closes the pipe, waits for ffmpeg to flush and returns the MP4 bytes."""
+        if self._proc is None: return None
+        proc, self._proc = self._proc, None
+        try:
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        self._reader.join()
+        self._stderr = proc.stderr.read()
+        proc.wait()
+        if proc.returncode != 0 or self.frames_written == 0:
+            if proc.returncode != 0:
+                print(f"[Encoder] ffmpeg exited with {proc.returncode}: {self._stderr.decode(errors='replace').strip()}")
+            return None
+        return self._output.getvalue()
+
+    def abort(self):
+        """Kills ffmpeg and discards everything encoded so far."""
+        if self._proc is None: return
+        proc, self._proc = self._proc, None
+        try:
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        proc.kill()
+        proc.wait()
+        self._reader.join()
+        self._output = BytesIO()
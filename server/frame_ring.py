@@ -0,0 +1,165 @@
+import threading
+from collections import deque
+
+import numpy as np
+
+
+class FrameSlot:
+    """
+    One in-flight frame: a view into a FrameRing slot plus the index needed to release it.
+
+    Borrowed frames (index -1) instead wrap a capture buffer owned by the frame source
+    (zero-copy path); they only count against the ring's byte budget.
+    """
+    __slots__ = ("ring", "index", "array", "buffer", "patch", "timestamp")
+
+    def __init__(self, ring, index, array, buffer=None, timestamp=None):
+        self.ring = ring
+        self.index = index
+        # Even-sized logical frame (what detection and the cursor see)
+        self.array = array
+        # C-contiguous memory actually handed to the encoder (may include row padding)
+        self.buffer = array if buffer is None else buffer
+        # Optional (first_row, rows) replacing buffer rows when the buffer is read-only
+        self.patch = None
+        # Capture time (time.monotonic seconds), set by the capture stage
+        self.timestamp = timestamp
+
+    def release(self):
+        if self.ring is not None:
+            if self.index < 0:
+                self.ring.return_borrowed(self.buffer.nbytes)
+                # Let the source's buffer go right away
+                self.array = self.buffer = self.patch = None
+            else:
+                self.ring.release(self.index)
+            self.ring = None
+
+
+# ─────────────────────────────────────────────────────────
+# PREALLOCATED FRAME RING
+# ─────────────────────────────────────────────────────────
+class FrameRing:
+    """
+    Fixed-shape frame store allocated once up front (optionally memory-mapped).
+    Capture writes straight into a free slot, downstream stages release it when
+    done, so recorder memory is capped at capacity_bytes and the capture loop
+    never allocates per frame.
+    """
+
+    def __init__(self, capacity_bytes, mmap_path=None):
+        self.capacity_bytes = int(capacity_bytes)
+        self.mmap_path = mmap_path
+
+        self.shape = None
+        self.slots = 0
+        self._buffer = None
+        self._free = deque()
+        self._in_use = []
+        self._lock = threading.Lock()
+
+        self._borrowed_bytes = 0
+
+        self.acquired = 0
+        self.borrowed = 0
+        self.exhausted = 0
+        self.reallocations = 0
+
+    @property
+    def frame_bytes(self) -> int:
+        return int(np.prod(self.shape)) if self.shape else 0
+
+    @property
+    def nbytes(self) -> int:
+        return self.frame_bytes * self.slots
+
+    @property
+    def in_use(self) -> int:
+        with self._lock:
+            return self.slots - len(self._free)
+
+    def _allocate(self, shape):
+        frame_bytes = int(np.prod(shape))
+        slots = self.capacity_bytes // frame_bytes
+        if slots < 1:
+            raise ValueError(f"Frame ring capacity {self.capacity_bytes} B cannot hold one {shape} frame ({frame_bytes} B)")
+
+        if self.mmap_path:
+            buffer = np.memmap(self.mmap_path, dtype=np.uint8, mode="w+", shape=(slots, *shape))
+        else:
+            buffer = np.empty((slots, *shape), dtype=np.uint8)
+
+        if self._buffer is not None:
+            self.reallocations += 1
+        self._buffer = buffer
+        self.shape = tuple(shape)
+        self.slots = slots
+        # LIFO free list: the most recently released slot is reused first, so only as many
+        # slots as are ever in flight get touched (and become resident), not the whole ring
+        self._free = deque(range(slots - 1, -1, -1))
+        self._in_use = [False] * slots
+        print(f"[FrameRing] {slots} slots of {shape} ({self.nbytes / 1e6:.1f} MB)")
+
+    def acquire(self, shape):
+        """
+        Returns a FrameSlot for a frame of the given shape, or None when every slot is in use.
+        The ring is (re)allocated on first use or when the shape changes while nothing is in flight.
+        """
+        shape = tuple(shape)
+        with self._lock:
+            if shape != self.shape:
+                if self._buffer is not None and len(self._free) != self.slots:
+                    self.exhausted += 1
+                    return None
+                self._allocate(shape)
+            if not self._free:
+                self.exhausted += 1
+                return None
+            index = self._free.pop()
+            self._in_use[index] = True
+            self.acquired += 1
+            return FrameSlot(self, index, self._buffer[index])
+
+    def borrow(self, array, buffer):
+        """
+        Wraps an external capture buffer as a FrameSlot without copying it. Its size counts
+        against capacity_bytes (together with the slots in use) until released; returns
+        None when that budget is used up.
+        """
+        nbytes = buffer.nbytes
+        with self._lock:
+            # Only slots holding a frame count: idle slots of a ring allocated earlier (e.g.
+            # while frames were downscaled) must not lock borrowing out for good
+            in_use_bytes = (self.slots - len(self._free)) * self.frame_bytes
+            if in_use_bytes + self._borrowed_bytes + nbytes > self.capacity_bytes:
+                self.exhausted += 1
+                return None
+            self._borrowed_bytes += nbytes
+            self.borrowed += 1
+        return FrameSlot(self, -1, array, buffer=buffer)
+
+    def return_borrowed(self, nbytes):
+        with self._lock:
+            self._borrowed_bytes = max(0, self._borrowed_bytes - nbytes)
+
+    def release(self, index):
+        with self._lock:
+            if index < self.slots and self._in_use[index]:
+                self._in_use[index] = False
+                self._free.append(index)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "shape": self.shape,
+                "slots": self.slots,
+                "in_use": self.slots - len(self._free),
+                "capacity_bytes": self.capacity_bytes,
+                "allocated_bytes": self.nbytes,
+                "acquired": self.acquired,
+                "borrowed": self.borrowed,
+                "borrowed_bytes": self._borrowed_bytes,
+                "exhausted": self.exhausted,
+                "reallocations": self.reallocations,
+                "memory_mapped": bool(self.mmap_path),
+            }
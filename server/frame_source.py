@@ -0,0 +1,387 @@
+"""
+Frame sources for the recorder.
+
+A FrameSource hands out the current picture as an (h, w, 4) BGRA uint8 array
+(possibly a view into a stride-padded buffer it owns). The recorder either
+copies it once into a FrameRing slot via grab() / grab_bgra(), or, for sources
+that return a fresh buffer on every read, borrows that buffer and streams it
+to the encoder untouched (grab_bgra(borrow=True)). Backends:
+
+    quartz     - a single macOS window (CGWindowListCreateImage)
+    mss        - a monitor or screen region through mss (Linux, Windows, macOS)
+    synthetic  - deterministic generated IDE-like footage, no display needed
+
+create_frame_source() picks one from arguments or the RECORDER_SOURCE env var.
+"""
+
+import os
+import time
+
+import numpy as np
+
+try:
+    import Quartz
+except ImportError:
+    Quartz = None
+
+try:
+    import mss
+except ImportError:
+    mss = None
+
+
+def even_size(height, width):
+    """Encoders need even dimensions, so odd sizes are cropped by one pixel."""
+    return height - (height % 2), width - (width % 2)
+
+
+class FrameSource:
+    """Base class: subclasses implement read() and optionally window_origin() / cursor_position()."""
+
+    name = "base"
+    # True when every read returns a new buffer that stays valid after the next read
+    fresh_buffers = False
+    # (height, width) of the last frame grabbed, before any downscaling
+    native_size = None
+
+    def read(self):
+        """Returns the current frame as an (h, w, 4) BGRA array, or None if nothing could be captured."""
+        raise NotImplementedError
+
+    def read_padded(self):
+        """
+        Returns (buffer, width): the frame as a C-contiguous (h, stride, 4) BGRA buffer, where
+        stride >= width includes any row padding, and the visible width. (None, 0) on failure.
+        """
+        bgra = self.read()
+        if bgra is None: return None, 0
+        return np.ascontiguousarray(bgra), bgra.shape[1]
+
+    def window_origin(self):
+        """Screen coordinates of the captured area's top-left corner, used to place the cursor."""
+        return (0, 0)
+
+    def cursor_position(self):
+        """Cursor position in screen coordinates if the source knows it, else None (use the OS pointer)."""
+        return None
+
+    def close(self):
+        pass
+
+    def grab(self, ring, step=1, scaler=None):
+        """
+        Captures a frame and copies it as RGB into a free slot of ring. Returns the FrameSlot or None.
+        step > 1 keeps every step-th pixel in each direction (a cheap integer downscale); an
+        enabled FrameScaler instead resizes to its size cap (with step folded in).
+        """
+        bgra = self.read()
+        if bgra is None: return None
+        self.native_size = bgra.shape[:2]
+        if scaler is not None and scaler.enabled:
+            h, w = scaler.target_size(*bgra.shape[:2], step)
+            if (h, w) != even_size(*bgra.shape[:2]):
+                slot = ring.acquire((h, w, 3))
+                if slot is None: return None
+                scaler.resize_into(bgra, slot.array, to_rgb=True)
+                return slot
+        elif step > 1:
+            bgra = bgra[::step, ::step]
+        h, w = even_size(*bgra.shape[:2])
+        slot = ring.acquire((h, w, 3))
+        if slot is None: return None
+        # Crop, drop alpha and reverse BGR -> RGB as views; the copy into the slot is the only one
+        np.copyto(slot.array, bgra[:h, :w, 2::-1])
+        return slot
+
+    def grab_bgra(self, ring, borrow=False, step=1, scaler=None):
+        """
+        Like grab() but keeps native BGRA. With borrow=True and a source that returns fresh
+        buffers, nothing is copied: the slot wraps the padded capture buffer itself
+        (only at native size; downscaled frames are always copied).
+        """
+        buffer, width = self.read_padded()
+        if buffer is None: return None
+        self.native_size = (buffer.shape[0], width)
+        if scaler is not None and scaler.enabled:
+            h, w = scaler.target_size(buffer.shape[0], width, step)
+            if (h, w) != even_size(buffer.shape[0], width):
+                slot = ring.acquire((h, w, 4))
+                if slot is None: return None
+                scaler.resize_into(buffer[:, :width], slot.array)
+                return slot
+            step = 1
+        if step > 1:
+            buffer, width = buffer[::step, :width:step], -(-width // step)
+        h, w = even_size(buffer.shape[0], width)
+        view = buffer[:h, :w]
+        if borrow and self.fresh_buffers and step == 1:
+            return ring.borrow(view, buffer)
+        slot = ring.acquire((h, w, 4))
+        if slot is None: return None
+        np.copyto(slot.array, view)
+        return slot
+
+    def capture(self):
+        """Captures a frame as a new even-sized RGB array (for callers without a frame ring)."""
+        bgra = self.read()
+        if bgra is None: return None
+        h, w = even_size(*bgra.shape[:2])
+        return np.ascontiguousarray(bgra[:h, :w, 2::-1])
+
+
+# ─────────────────────────────────────────────────────────
+# QUARTZ (macOS window)
+# ─────────────────────────────────────────────────────────
+class QuartzFrameSource(FrameSource):
+    name = "quartz"
+    # Every CGWindowListCreateImage call returns a new CFData
+    fresh_buffers = True
+
+    def __init__(self, window_id):
+        if Quartz is None:
+            raise RuntimeError("Quartz is not available (pyobjc-framework-Quartz, macOS only)")
+        self.window_id = window_id
+
+    def read(self):
+        buffer, width = self.read_padded()
+        if buffer is None: return None
+        return buffer[:, :width]
+
+    def read_padded(self):
+        if not self.window_id: return None, 0
+        image_ref = Quartz.CGWindowListCreateImage(
+            Quartz.CGRectNull,
+            Quartz.kCGWindowListOptionIncludingWindow,
+            self.window_id,
+            Quartz.kCGWindowImageBoundsIgnoreFraming | Quartz.kCGWindowImageNominalResolution
+        )
+        if not image_ref: return None, 0
+
+        w = Quartz.CGImageGetWidth(image_ref)
+        h = Quartz.CGImageGetHeight(image_ref)
+        bpr = Quartz.CGImageGetBytesPerRow(image_ref)
+
+        pixel_data = Quartz.CGDataProviderCopyData(Quartz.CGImageGetDataProvider(image_ref))
+        buff = np.frombuffer(pixel_data, dtype=np.uint8)
+
+        # Rows are padded to bytes-per-row: expose the padded rows as extra pixels
+        # rather than repacking them
+        return buff[:h * bpr].reshape((h, bpr // 4, 4)), w
+
+    def window_origin(self):
+        win_info_list = Quartz.CGWindowListCopyWindowInfo(Quartz.kCGWindowListOptionIncludingWindow, self.window_id)
+        if not win_info_list: return None
+        bounds = win_info_list[0].get('kCGWindowBounds', {})
+        return bounds.get('X', 0), bounds.get('Y', 0)
+
+
+# ─────────────────────────────────────────────────────────
+# MSS (monitor / region, cross-platform)
+# ─────────────────────────────────────────────────────────
+class MssFrameSource(FrameSource):
+    name = "mss"
+    # Each grab returns new bytes
+    fresh_buffers = True
+
+    def __init__(self, monitor=1, region=None):
+        """monitor: index into mss monitors (1 = primary); region: optional dict with left/top/width/height."""
+        if mss is None:
+            raise RuntimeError("mss is not installed")
+        self.monitor = monitor
+        self.region = region
+        self._sct = None
+
+    def _area(self):
+        if self._sct is None:
+            self._sct = mss.mss()
+        return self.region or self._sct.monitors[self.monitor]
+
+    def read(self):
+        area = self._area()
+        shot = self._sct.grab(area)
+        return np.frombuffer(shot.raw, dtype=np.uint8).reshape((shot.height, shot.width, 4))
+
+    def window_origin(self):
+        area = self._area()
+        return area["left"], area["top"]
+
+    def close(self):
+        if self._sct is not None:
+            self._sct.close()
+            self._sct = None
+
+
+# ─────────────────────────────────────────────────────────
+# SYNTHETIC (deterministic test footage)
+# ─────────────────────────────────────────────────────────
+class SyntheticFrameSource(FrameSource):
+    """
+    Generates IDE-like footage without a display: a dark editor page of coloured
+    "text" runs. The script is a list of (pattern, seconds) phases played in a loop:
+
+        typing     - characters appear one by one on the caret line, caret cursor follows
+        scrolling  - the page scrolls by one line per frame
+        video      - full-screen motion: a textured plate pans under the whole frame
+        idle       - nothing changes
+
+    Output depends only on the frame index, so runs are reproducible. With
+    realtime=True the index follows the wall clock at fps instead of advancing
+    once per read, like a real screen does when the reader slows down.
+    """
+
+    name = "synthetic"
+    PATTERNS = ("typing", "scrolling", "video", "idle")
+    LINE_HEIGHT = 18
+    CHAR_WIDTH = 8
+
+    def __init__(self, width=1280, height=800, fps=10, script=(("typing", 5), ("idle", 8), ("scrolling", 3)), seed=0,
+                 realtime=False):
+        for pattern, _ in script:
+            if pattern not in self.PATTERNS:
+                raise ValueError(f"Unknown synthetic pattern '{pattern}', expected one of {self.PATTERNS}")
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.script = [(pattern, max(1, int(round(seconds * fps)))) for pattern, seconds in script]
+        self.frame_index = 0
+        self.realtime = realtime
+        self._started = None
+
+        rng = np.random.default_rng(seed)
+        lines = self.height // self.LINE_HEIGHT
+        self._page = self._render_page(rng, lines * 4)
+        self._frame = np.empty((height, width, 4), dtype=np.uint8)
+        self._scroll = 0
+        self._typed = 0
+        self._caret_line = lines // 2
+        self._cursor = (width // 2, height // 2)
+        self._video_plate = None
+        self._video_step = 0
+        if any(pattern == "video" for pattern, _ in script):
+            self._video_plate = self._render_video_plate(rng)
+
+    def _render_page(self, rng, lines):
+        page = np.empty((lines * self.LINE_HEIGHT, self.width, 4), dtype=np.uint8)
+        page[:] = (40, 30, 30, 255)  # BGRA editor background
+        max_chars = (self.width - 80) // self.CHAR_WIDTH
+        for line in range(lines):
+            y = line * self.LINE_HEIGHT + 4
+            x = 60 + int(rng.integers(0, 4)) * 4 * self.CHAR_WIDTH
+            for _ in range(int(rng.integers(0, 6))):
+                run = int(rng.integers(2, 12))
+                if (x - 60) // self.CHAR_WIDTH + run > max_chars: break
+                colour = (*rng.integers(110, 240, size=3), 255)
+                page[y:y + 10, x:x + run * self.CHAR_WIDTH - 2] = colour
+                x += (run + 1) * self.CHAR_WIDTH
+        return page
+
+    def _render_video_plate(self, rng):
+        # Coarse noise blown up 8x: detailed enough to keep the encoder busy, cheap to pan
+        cells = rng.integers(0, 256, size=((self.height + 64) // 8 + 1, (self.width + 64) // 8 + 1, 4), dtype=np.uint8)
+        cells[..., 3] = 255
+        return np.repeat(np.repeat(cells, 8, axis=0), 8, axis=1)
+
+    def current_pattern(self):
+        position = self.frame_index % sum(frames for _, frames in self.script)
+        for pattern, frames in self.script:
+            if position < frames:
+                return pattern
+            position -= frames
+
+    def read(self):
+        if not self.realtime:
+            return self._render(self._advance())
+        now = time.monotonic()
+        if self._started is None:
+            self._started = now
+        due = int((now - self._started) * self.fps) + 1
+        if due <= self.frame_index:
+            return self._frame
+        while self.frame_index < due:
+            pattern = self._advance()
+        return self._render(pattern)
+
+    def _advance(self):
+        """Moves the animation on by one frame and returns the pattern it was in."""
+        pattern = self.current_pattern()
+        if pattern == "scrolling":
+            self._scroll = (self._scroll + self.LINE_HEIGHT) % (self._page.shape[0] - self.height)
+            self._typed = 0
+        elif pattern == "typing":
+            self._typed += 1
+        elif pattern == "video":
+            self._video_step += 1
+            self._typed = 0
+        self.frame_index += 1
+        return pattern
+
+    def _render(self, pattern):
+        if pattern == "video":
+            offset = (self._video_step * 3) % 64
+            self._frame[:] = self._video_plate[offset:offset + self.height, offset:offset + self.width]
+            return self._frame
+
+        self._frame[:] = self._page[self._scroll:self._scroll + self.height]
+        if self._typed:
+            # Typed characters on the caret line
+            y = self._caret_line * self.LINE_HEIGHT + 4
+            chars = min(self._typed, (self.width - 80) // self.CHAR_WIDTH)
+            x1 = 60 + chars * self.CHAR_WIDTH
+            self._frame[y - 4:y + self.LINE_HEIGHT - 4, 60:x1 + 2] = (40, 30, 30, 255)
+            self._frame[y:y + 10, 60:x1 - 2] = (220, 220, 220, 255)
+            self._cursor = (x1, y + 6)
+        return self._frame
+
+    def window_origin(self):
+        return (0, 0)
+
+    def cursor_position(self):
+        return self._cursor
+
+
+# ─────────────────────────────────────────────────────────
+# CONFIG
+# ─────────────────────────────────────────────────────────
+def _parse_script(text):
+    """'typing:5,idle:8,scrolling:3' -> [('typing', 5.0), ('idle', 8.0), ('scrolling', 3.0)]"""
+    script = []
+    for part in text.split(","):
+        pattern, _, seconds = part.strip().partition(":")
+        script.append((pattern, float(seconds or 1)))
+    return script
+
+
+def create_frame_source(kind=None, **options) -> FrameSource:
+    """
+    Builds a frame source by name. Unset options fall back to environment variables:
+        RECORDER_SOURCE            quartz (default) | mss | synthetic
+        RECORDER_MSS_MONITOR       mss monitor index (default 1)
+        RECORDER_SYNTHETIC_SIZE    e.g. 1920x1080 (default 1280x800)
+        RECORDER_SYNTHETIC_SCRIPT  e.g. typing:5,idle:8,scrolling:3
+        RECORDER_SYNTHETIC_REALTIME  1 to play the script against the wall clock
+    """
+    kind = (kind or os.getenv("RECORDER_SOURCE", "quartz")).lower()
+
+    if kind == "quartz":
+        window_id = options.get("window_id")
+        if window_id is None:
+            from screenmanager.screenmanager import pick_window
+            window_id = pick_window()['windowID']
+        return QuartzFrameSource(window_id)
+
+    if kind == "mss":
+        monitor = options.get("monitor", int(os.getenv("RECORDER_MSS_MONITOR", "1")))
+        return MssFrameSource(monitor=monitor, region=options.get("region"))
+
+    if kind == "synthetic":
+        if "width" not in options or "height" not in options:
+            width, _, height = os.getenv("RECORDER_SYNTHETIC_SIZE", "1280x800").partition("x")
+            options.setdefault("width", int(width))
+            options.setdefault("height", int(height))
+        if "script" not in options and os.getenv("RECORDER_SYNTHETIC_SCRIPT"):
+            options["script"] = _parse_script(os.getenv("RECORDER_SYNTHETIC_SCRIPT"))
+        if "realtime" not in options and os.getenv("RECORDER_SYNTHETIC_REALTIME"):
+            options["realtime"] = os.getenv("RECORDER_SYNTHETIC_REALTIME") not in ("0", "false", "")
+        return SyntheticFrameSource(**options)
+
+    raise ValueError(f"Unknown frame source '{kind}', expected quartz, mss or synthetic")
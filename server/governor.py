@@ -0,0 +1,120 @@
+import threading
+import time
+
+
+# ─────────────────────────────────────────────────────────
+# CAPTURE GOVERNOR
+# ─────────────────────────────────────────────────────────
+class CaptureGovernor:
+    """
+    Decides how hard the recorder works from moment to moment.
+
+    Activity: while nothing is happening on screen the recorder only probes at
+    probe_fps (those sessions are thrown away anyway); as soon as the detect
+    stage sees activity it ramps up to the full rate until the session ends.
+
+    CPU budget: with cpu_budget set (in cores, e.g. 0.5 = half a core), the
+    recorder's CPU time (cpu_time(); the recorder adds its ffmpeg encoders to
+    this process) is sampled every sample_seconds. Over budget, the governor
+    steps down one level of LEVELS; comfortably under it (below recover_ratio
+    of the budget), it steps back up. Levels trade detection frequency first,
+    then frame rate, then resolution. Resolution only changes while idle, so an
+    active recording never changes size halfway through.
+    """
+
+    # (fps factor, downscale step, detection interval factor), cheapest last
+    LEVELS = (
+        (1.0, 1, 1),
+        (1.0, 1, 2),
+        (0.5, 1, 2),
+        (0.5, 2, 2),
+        (0.25, 2, 4),
+    )
+
+    def __init__(self, fps, probe_fps=2, cpu_budget=None, detect_interval=1.0,
+                 sample_seconds=2.0, recover_ratio=0.7, cpu_time=time.process_time):
+        self.target_fps = fps
+        self.probe_fps = probe_fps
+        self.cpu_budget = cpu_budget
+        self.base_detect_interval = detect_interval
+        self.sample_seconds = sample_seconds
+        self.recover_ratio = recover_ratio
+        self.cpu_time = cpu_time
+
+        self.active = False
+        self.level = 0
+        self.cpu_usage = None
+        self.level_changes = 0
+        self._step = 1
+        self._sample_start = None
+        self._lock = threading.Lock()
+
+    def on_activity(self):
+        """Visual activity seen: record at the full (budgeted) rate."""
+        self.active = True
+
+    def on_idle(self):
+        """The session ended: drop back to probing and apply any pending resolution change."""
+        with self._lock:
+            self.active = False
+            self._step = self.LEVELS[self.level][1]
+
+    def reset(self):
+        with self._lock:
+            self.active = False
+            self._sample_start = None
+
+    def tick(self):
+        """Called once per capture iteration: samples CPU use and moves between levels."""
+        if not self.cpu_budget: return
+        wall, cpu = time.monotonic(), self.cpu_time()
+        with self._lock:
+            if self._sample_start is None:
+                self._sample_start = (wall, cpu)
+                return
+            start_wall, start_cpu = self._sample_start
+            if wall - start_wall < self.sample_seconds: return
+            self._sample_start = (wall, cpu)
+            self.cpu_usage = (cpu - start_cpu) / (wall - start_wall)
+
+            level = self.level
+            if self.cpu_usage > self.cpu_budget:
+                level = min(level + 1, len(self.LEVELS) - 1)
+            elif self.cpu_usage < self.cpu_budget * self.recover_ratio:
+                level = max(level - 1, 0)
+            if level != self.level:
+                self.level = level
+                self.level_changes += 1
+                if not self.active:
+                    self._step = self.LEVELS[level][1]
+
+    @property
+    def fps(self):
+        full = max(1, self.target_fps * self.LEVELS[self.level][0])
+        if self.probe_fps and not self.active:
+            return min(self.probe_fps, full)
+        return max(full, self.probe_fps or 1)
+
+    @property
+    def scale_step(self) -> int:
+        """Integer downscale factor for captured frames (1 = native resolution)."""
+        return self._step
+
+    @property
+    def detect_interval(self) -> float:
+        """Seconds between activity checks."""
+        return self.base_detect_interval * self.LEVELS[self.level][2]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "active": self.active,
+                "fps": self.fps,
+                "target_fps": self.target_fps,
+                "level": self.level,
+                "scale_step": self._step,
+                "detect_interval": self.detect_interval,
+                "cpu_budget": self.cpu_budget,
+                "cpu_usage": round(self.cpu_usage, 3) if self.cpu_usage is not None else None,
+                "level_changes": self.level_changes,
+            }
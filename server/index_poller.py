@@ -0,0 +1,135 @@
+import random
+import statistics
+import threading
+import time
+from collections import deque
+
+
+class _Job:
+    __slots__ = ("index_id", "asset_id", "started", "next_poll", "done", "status", "error", "polls")
+
+    def __init__(self, index_id, asset_id, now):
+        self.index_id = index_id
+        self.asset_id = asset_id
+        self.started = now
+        self.next_poll = now
+        self.done = threading.Event()
+        self.status = None
+        self.error = None
+        self.polls = 0
+
+
+# ─────────────────────────────────────────────────────────
+# INDEXING STATUS POLLER
+# ─────────────────────────────────────────────────────────
+class IndexStatusPoller:
+    """
+    One thread polls the status of every in-flight indexed asset, instead of
+    a back-off loop per analysis. Each pass retrieves only the assets that
+    are due, and a waiter wakes the moment its asset reports ready (or
+    failed).
+
+    Polling adapts to how long indexing has been taking: the median of the
+    last `history` indexing times is the expected wait. An asset far from
+    that point is polled rarely (half the remaining time, up to
+    max_interval); near and past it, every min_interval, easing off again
+    the longer it is overdue. Every interval gets +/- jitter so concurrent
+    jobs do not poll in lockstep.
+    """
+
+    def __init__(self, client_fn, min_interval=1.0, max_interval=10.0, jitter=0.2,
+                 initial_estimate=20.0, history=20):
+        self.client_fn = client_fn
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self.initial_estimate = initial_estimate
+        self._durations = deque(maxlen=history)
+        self._jobs = {}
+        self._cond = threading.Condition()
+        self._thread = None
+
+        self.polls = 0
+        self.poll_errors = 0
+
+    def wait_ready(self, index_id, asset_id, timeout):
+        """Blocks until the asset is indexed. Raises TimeoutError, or RuntimeError if indexing failed."""
+        job = _Job(index_id, asset_id, time.monotonic())
+        with self._cond:
+            self._jobs[asset_id] = job
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="index-poller", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        try:
+            if not job.done.wait(timeout):
+                raise TimeoutError(f"Indexing timed out after {timeout} seconds")
+        finally:
+            with self._cond:
+                self._jobs.pop(asset_id, None)
+        if job.error is not None:
+            raise job.error
+        if job.status != "ready":
+            raise RuntimeError(f"Indexing {asset_id} ended with status '{job.status}'")
+
+    @property
+    def expected_seconds(self) -> float:
+        return statistics.median(self._durations) if self._durations else self.initial_estimate
+
+    def _interval(self, age):
+        expected = self.expected_seconds
+        remaining = expected - age
+        if remaining > 0:
+            interval = remaining / 2
+        else:
+            interval = self.min_interval * (1 - remaining / max(expected, 1e-3))
+        interval = min(self.max_interval, max(self.min_interval, interval))
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._jobs:
+                    self._thread = None
+                    return
+                now = time.monotonic()
+                due = [job for job in self._jobs.values() if job.next_poll <= now]
+                if not due:
+                    self._cond.wait(min(job.next_poll for job in self._jobs.values()) - now)
+                    continue
+            self._poll(due)
+
+    def _poll(self, jobs):
+        client = self.client_fn()
+        for job in jobs:
+            if job.done.is_set(): continue
+            try:
+                status = client.indexes.indexed_assets.retrieve(
+                    index_id=job.index_id,
+                    indexed_asset_id=job.asset_id
+                )
+                status = getattr(status, "status", None)
+            except Exception as e:
+                self.poll_errors += 1
+                job.error = e
+                job.done.set()
+                continue
+            self.polls += 1
+            job.polls += 1
+            now = time.monotonic()
+            if status in ("ready", "failed"):
+                job.status = status
+                if status == "ready":
+                    self._durations.append(now - job.started)
+                job.done.set()
+            else:
+                job.next_poll = now + self._interval(now - job.started)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "in_flight": len(self._jobs),
+                "polls": self.polls,
+                "poll_errors": self.poll_errors,
+                "expected_index_seconds": round(self.expected_seconds, 2),
+            }
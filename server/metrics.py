@@ -0,0 +1,224 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+
+# Histogram bucket upper bounds in milliseconds (the last bucket is unbounded)
+DEFAULT_BUCKETS_MS = (0.25, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000, 300000)
+
+
+# ─────────────────────────────────────────────────────────
+# METRIC TYPES
+# ─────────────────────────────────────────────────────────
+class Histogram:
+    """
+    Fixed-bucket latency histogram. observe() is O(log buckets) and allocation-free,
+    so it is cheap enough for per-frame hot paths; percentiles are estimated by
+    interpolating inside the bucket that holds them.
+    """
+
+    def __init__(self, buckets_ms=DEFAULT_BUCKETS_MS):
+        self.buckets_ms = tuple(buckets_ms)
+        self._counts = [0] * (len(self.buckets_ms) + 1)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total_ms = 0.0
+        self.min_ms = None
+        self.max_ms = None
+
+    def observe(self, seconds):
+        ms = seconds * 1000.0
+        i = bisect_left(self.buckets_ms, ms)
+        with self._lock:
+            self._counts[i] += 1
+            self.count += 1
+            self.total_ms += ms
+            if self.min_ms is None or ms < self.min_ms: self.min_ms = ms
+            if self.max_ms is None or ms > self.max_ms: self.max_ms = ms
+
+    def percentile(self, q):
+        """Estimated q-th percentile (0-100) in milliseconds, or None when empty."""
+        with self._lock:
+            return self._percentile(q)
+
+    def _percentile(self, q):
+        if not self.count: return None
+        rank = q / 100.0 * self.count
+        seen = 0
+        for i, n in enumerate(self._counts):
+            if n and seen + n >= rank:
+                low = self.buckets_ms[i - 1] if i > 0 else 0.0
+                high = self.buckets_ms[i] if i < len(self.buckets_ms) else self.max_ms
+                estimate = low + (high - low) * max(0.0, rank - seen) / n
+                return min(max(estimate, self.min_ms), self.max_ms)
+            seen += n
+        return self.max_ms
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            if not self.count:
+                return {"count": 0}
+            return {
+                "count": self.count,
+                "mean_ms": round(self.total_ms / self.count, 3),
+                "min_ms": round(self.min_ms, 3),
+                "p50_ms": round(self._percentile(50), 3),
+                "p95_ms": round(self._percentile(95), 3),
+                "p99_ms": round(self._percentile(99), 3),
+                "max_ms": round(self.max_ms, 3),
+            }
+
+
+class RateMeter:
+    """Events per second over a sliding window of whole-second buckets."""
+
+    def __init__(self, window_seconds=10):
+        self.window_seconds = max(1, int(window_seconds))
+        self._buckets = [0] * (self.window_seconds + 1)
+        self._seconds = [None] * (self.window_seconds + 1)
+        self._first_second = None
+        self._lock = threading.Lock()
+
+    def mark(self, n=1, now=None):
+        second = int(time.monotonic() if now is None else now)
+        i = second % len(self._buckets)
+        with self._lock:
+            if self._first_second is None:
+                self._first_second = second
+            if self._seconds[i] != second:
+                self._seconds[i] = second
+                self._buckets[i] = 0
+            self._buckets[i] += n
+
+    def rate(self, now=None) -> float:
+        # The current second is still filling up, so it is left out
+        current = int(time.monotonic() if now is None else now)
+        with self._lock:
+            if self._first_second is None: return 0.0
+            # Shorter than the window right after the first event
+            span = min(self.window_seconds, current - self._first_second)
+            if span <= 0: return 0.0
+            total = sum(n for s, n in zip(self._seconds, self._buckets)
+                        if s is not None and current - span <= s < current)
+        return total / span
+
+
+# ─────────────────────────────────────────────────────────
+# REGISTRY
+# ─────────────────────────────────────────────────────────
+class MetricsRegistry:
+    """
+    Named histograms, counters, rates and gauges. Gauges are callables evaluated
+    only when a snapshot is taken, so reading queue depths or buffer sizes costs
+    nothing on the hot path.
+    """
+
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._rates = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name) -> Histogram:
+        hist = self._histograms.get(name)
+        if hist is None:
+            with self._lock:
+                hist = self._histograms.setdefault(name, Histogram())
+        return hist
+
+    def observe(self, name, seconds):
+        self.histogram(name).observe(seconds)
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.histogram(name).observe(time.perf_counter() - start)
+
+    def incr(self, name, n=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def counter(self, name) -> int:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def rate(self, name) -> RateMeter:
+        meter = self._rates.get(name)
+        if meter is None:
+            with self._lock:
+                meter = self._rates.setdefault(name, RateMeter())
+        return meter
+
+    def gauge(self, name, fn):
+        """Registers fn() as the current value of name."""
+        with self._lock:
+            self._gauges[name] = fn
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            histograms = dict(self._histograms)
+            counters = dict(self._counters)
+            rates = dict(self._rates)
+            gauges = dict(self._gauges)
+        values = {}
+        for name, fn in gauges.items():
+            try:
+                values[name] = fn()
+            except Exception as e:
+                values[name] = f"error: {e}"
+        return {
+            "timestamp": time.time(),
+            "histograms": {name: h.snapshot() for name, h in sorted(histograms.items())},
+            "counters": dict(sorted(counters.items())),
+            "rates_per_second": {name: round(m.rate(), 2) for name, m in sorted(rates.items())},
+            "gauges": values,
+        }
+
+
+# ─────────────────────────────────────────────────────────
+# PERIODIC JSON EXPORT
+# ─────────────────────────────────────────────────────────
+class MetricsExporter:
+    """
+    Writes snapshot() to a JSON file every interval seconds. The file is replaced
+    atomically, so readers never see a partial snapshot.
+    """
+
+    def __init__(self, snapshot, path, interval=10.0):
+        self.snapshot = snapshot
+        self.path = path
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None: return
+        self._thread = threading.Thread(target=self._run, name="metrics-export", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.write()
+
+    def write(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2, default=str)
+        os.replace(tmp_path, self.path)
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.write()
+            except Exception as e:
+                print(f"[Metrics] Snapshot export failed: {e}")
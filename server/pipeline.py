@@ -0,0 +1,262 @@
+import threading
+import time
+from collections import deque
+
+
+class QueueClosed(Exception):
+    """Raised by FrameQueue.get once the queue is closed and fully drained."""
+
+
+# Control markers passed down the pipeline between frames
+SESSION_FINISH = "session_finish"
+SESSION_DISCARD = "session_discard"
+SEGMENT_SPLIT = "segment_split"
+
+
+# ─────────────────────────────────────────────────────────
+# BOUNDED STAGE QUEUE
+# ─────────────────────────────────────────────────────────
+class FrameQueue:
+    """
+    Bounded hand-off between pipeline stages.
+
+    Policies when the queue is full:
+      - "block":       the producer waits for space (backpressure)
+      - "drop_oldest": the oldest queued item is evicted to make room
+      - "drop_newest": the incoming item is dropped
+    Every drop is counted so stalls downstream are visible, and on_drop is
+    called with the dropped item so it can give back any buffer it holds.
+    """
+
+    POLICIES = ("block", "drop_oldest", "drop_newest")
+
+    def __init__(self, maxsize, policy="block", name="queue", on_drop=None):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown queue policy '{policy}', expected one of {self.POLICIES}")
+        self.maxsize = max(1, int(maxsize))
+        self.policy = policy
+        self.name = name
+        self.on_drop = on_drop
+
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self.put_count = 0
+        self.dropped = 0
+        self.blocked_seconds = 0.0
+        self.max_depth = 0
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
+
+    def put(self, item, control=False) -> bool:
+        """
+        Enqueues an item according to the queue policy. Returns False if it was dropped.
+        Control markers always go through, even past maxsize, so session boundaries are never lost.
+        """
+        with self._cond:
+            if self._closed:
+                if not control and self.on_drop is not None:
+                    self.on_drop(item)
+                return False
+            if not control and len(self._items) >= self.maxsize:
+                if self.policy == "drop_newest":
+                    self._drop(item)
+                    return False
+                if self.policy == "drop_oldest":
+                    self._evict_oldest_frame()
+                else:
+                    wait_start = time.monotonic()
+                    while len(self._items) >= self.maxsize and not self._closed:
+                        self._cond.wait()
+                    self.blocked_seconds += time.monotonic() - wait_start
+                    if self._closed:
+                        if self.on_drop is not None:
+                            self.on_drop(item)
+                        return False
+            self._items.append(item)
+            self.put_count += 1
+            self.max_depth = max(self.max_depth, len(self._items))
+            self._cond.notify_all()
+            return True
+
+    def _evict_oldest_frame(self):
+        # Skip over control markers so a session boundary is never evicted
+        for i, queued in enumerate(self._items):
+            if not isinstance(queued, str):
+                del self._items[i]
+                self._drop(queued)
+                return
+        # Only control markers queued: let this put overflow rather than lose one
+
+    def _drop(self, item):
+        self.dropped += 1
+        if self.on_drop is not None:
+            self.on_drop(item)
+
+    def get(self, timeout=None):
+        """Returns the next item, or None on timeout. Raises QueueClosed once closed and empty."""
+        with self._cond:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not self._items:
+                if self._closed:
+                    raise QueueClosed(self.name)
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def close(self):
+        """Stops accepting items; consumers drain what is left and then get QueueClosed."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "name": self.name,
+                "policy": self.policy,
+                "depth": len(self._items),
+                "max_depth": self.max_depth,
+                "capacity": self.maxsize,
+                "put": self.put_count,
+                "dropped": self.dropped,
+                "blocked_seconds": round(self.blocked_seconds, 3),
+            }
+
+
+# ─────────────────────────────────────────────────────────
+# VIDEO HAND-OFF (recorder -> analysis)
+# ─────────────────────────────────────────────────────────
+class VideoChannel:
+    """
+    Blocking hand-off of finished videos from the recorder to the analysis
+    side: get() wakes as soon as a video is put, no polling.
+
+    Bounded by max_videos and max_bytes (a single video larger than
+    max_bytes still goes through when the channel is empty). When full:
+      - "drop_oldest": the oldest queued video is evicted (freshest data wins)
+      - "drop_newest": the incoming video is dropped
+      - "block":       the recorder waits for the analysis side
+    Empty items (len 0, e.g. a segment that only closes a session) carry no
+    data, are never dropped and do not count against the limits.
+    """
+
+    POLICIES = ("drop_oldest", "drop_newest", "block")
+
+    def __init__(self, max_videos=16, max_bytes=256 * 1024 * 1024, policy="drop_oldest", name="videos"):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown video channel policy '{policy}', expected one of {self.POLICIES}")
+        self.max_videos = max(1, int(max_videos))
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.name = name
+
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._videos = 0
+        self._bytes = 0
+
+        self.put_count = 0
+        self.dropped = 0
+        self.dropped_bytes = 0
+        self.max_depth = 0
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
+
+    def _full(self, size):
+        if not self._videos: return False
+        return self._videos >= self.max_videos or (self.max_bytes and self._bytes + size > self.max_bytes)
+
+    def put(self, video) -> bool:
+        """Hands a video over according to the channel policy. Returns False if it was dropped."""
+        size = len(video)
+        with self._cond:
+            if self._closed: return False
+            if size:
+                while self._full(size):
+                    if self.policy == "drop_newest":
+                        self._count_drop(size)
+                        return False
+                    if self.policy == "drop_oldest":
+                        self._evict_oldest()
+                    else:
+                        self._cond.wait()
+                        if self._closed: return False
+                self._videos += 1
+                self._bytes += size
+            self._items.append(video)
+            self.put_count += 1
+            self.max_depth = max(self.max_depth, self._videos)
+            self._cond.notify_all()
+            return True
+
+    def _evict_oldest(self):
+        for i, queued in enumerate(self._items):
+            if len(queued):
+                del self._items[i]
+                self._videos -= 1
+                self._bytes -= len(queued)
+                self._count_drop(len(queued))
+                return
+
+    def _count_drop(self, size):
+        self.dropped += 1
+        self.dropped_bytes += size
+
+    def get(self, timeout=None):
+        """Returns the next video, or None on timeout. Raises QueueClosed once closed and empty."""
+        with self._cond:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not self._items:
+                if self._closed:
+                    raise QueueClosed(self.name)
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            video = self._items.popleft()
+            if len(video):
+                self._videos -= 1
+                self._bytes -= len(video)
+            self._cond.notify_all()
+            return video
+
+    def drain(self) -> list:
+        """Removes and returns everything queued."""
+        with self._cond:
+            videos = list(self._items)
+            self._items.clear()
+            self._videos = self._bytes = 0
+            self._cond.notify_all()
+            return videos
+
+    def close(self):
+        """Stops accepting videos; consumers drain what is left and then get QueueClosed."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "name": self.name,
+                "policy": self.policy,
+                "videos": self._videos,
+                "bytes": self._bytes,
+                "max_depth": self.max_depth,
+                "max_videos": self.max_videos,
+                "max_bytes": self.max_bytes,
+                "put": self.put_count,
+                "dropped": self.dropped,
+                "dropped_bytes": self.dropped_bytes,
+            }
@@ -0,0 +1,76 @@
+import math
+
+import numpy as np
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+
+def _even(n):
+    return max(2, n - (n % 2))
+
+
+# ─────────────────────────────────────────────────────────
+# PRE-ENCODE DOWNSCALER
+# ─────────────────────────────────────────────────────────
+class FrameScaler:
+    """
+    Caps frame size before frames enter the frame ring, so big (Retina / 4K)
+    windows cost less memory, encode time and upload bandwidth.
+
+    max_dimension limits the longer side, max_pixels the total area; the aspect
+    ratio is kept and frames are never upscaled. Resizing uses cv2 area
+    interpolation (sharp text, no moire) in exact halvings, which OpenCV
+    vectorizes, and finishes the remaining < 2x step bilinearly; fractional
+    INTER_AREA is several times slower for no visible gain at those ratios.
+    Without OpenCV it falls back to nearest-neighbour sampling.
+    """
+
+    def __init__(self, max_dimension=None, max_pixels=None):
+        self.max_dimension = max_dimension
+        self.max_pixels = max_pixels
+        self._scratch = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.max_dimension or self.max_pixels)
+
+    def target_size(self, height, width, step=1):
+        """Output (height, width), both even, for a height x width frame further reduced by step."""
+        scale = 1.0 / step
+        if self.max_dimension:
+            scale = min(scale, self.max_dimension / max(height, width))
+        if self.max_pixels:
+            scale = min(scale, math.sqrt(self.max_pixels / (height * width)))
+        if scale >= 1.0:
+            return _even(height), _even(width)
+        return _even(int(height * scale)), _even(int(width * scale))
+
+    def resize_into(self, bgra, dst, to_rgb=False):
+        """Resizes a BGRA frame (any row stride) into dst, converting to RGB if to_rgb."""
+        height, width = dst.shape[:2]
+        if cv2 is None:
+            rows = np.arange(height) * bgra.shape[0] // height
+            cols = np.arange(width) * bgra.shape[1] // width
+            sampled = bgra[rows[:, None], cols]
+            np.copyto(dst, sampled[..., 2::-1] if to_rgb else sampled)
+            return dst
+        if not to_rgb:
+            return self._resize(bgra, dst)
+        # Resize in BGRA into a reused scratch buffer, then convert straight into the slot
+        if self._scratch is None or self._scratch.shape[:2] != (height, width):
+            self._scratch = np.empty((height, width, 4), dtype=np.uint8)
+        self._resize(bgra, self._scratch)
+        return cv2.cvtColor(self._scratch, cv2.COLOR_BGRA2RGB, dst=dst)
+
+    @staticmethod
+    def _resize(src, dst):
+        height, width = dst.shape[:2]
+        while src.shape[0] // 2 >= height and src.shape[1] // 2 >= width:
+            half = (src.shape[1] // 2, src.shape[0] // 2)
+            if half == (width, height):
+                return cv2.resize(src, half, dst=dst, interpolation=cv2.INTER_AREA)
+            src = cv2.resize(src, half, interpolation=cv2.INTER_AREA)
+        return cv2.resize(src, (width, height), dst=dst, interpolation=cv2.INTER_LINEAR)
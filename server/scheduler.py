@@ -0,0 +1,103 @@
+import threading
+import time
+
+
+# ─────────────────────────────────────────────────────────
+# FRAME SCHEDULER
+# ─────────────────────────────────────────────────────────
+class FrameScheduler:
+    """
+    Paces a capture loop against absolute deadlines on the monotonic clock:
+    slot k is due at start + k * period. A slow iteration does not shift the
+    cadence; slots that have already passed are skipped rather than captured
+    back to back, and every miss is counted.
+
+        scheduler = FrameScheduler(fps)
+        while scheduler.wait(stop_event):
+            capture()
+    """
+
+    def __init__(self, fps):
+        self._lock = threading.Lock()
+        self._set_period(fps)
+        self._origin_ns = None
+        self._slot = 0
+
+        self.frames = 0
+        self.skipped_slots = 0      # slots dropped because the loop was already past them
+        self.overruns = 0           # wake-ups that found the next slot already due
+        self.overrun_ns = 0         # total time spent behind schedule at those wake-ups
+        self.max_lateness_ns = 0    # worst wake-up lateness against a slot deadline
+        self.last_lateness_ns = 0
+
+    def _set_period(self, fps):
+        self.fps = fps
+        self.period_ns = int(1e9 / fps)
+
+    def set_fps(self, fps):
+        """Changes the rate; the next slot is one new period after the current one."""
+        with self._lock:
+            if fps == self.fps: return
+            if self._origin_ns is not None:
+                self._origin_ns = self._deadline(self._slot)
+                self._slot = 0
+            self._set_period(fps)
+
+    def reset(self):
+        with self._lock:
+            self._origin_ns = None
+            self._slot = 0
+
+    def _deadline(self, slot):
+        return self._origin_ns + slot * self.period_ns
+
+    def wait(self, stop_event=None):
+        """
+        Blocks until the next slot is due and returns its deadline (monotonic ns), or
+        None if stop_event was set. The first call starts the schedule right away.
+        """
+        with self._lock:
+            now = time.monotonic_ns()
+            if self._origin_ns is None:
+                self._origin_ns = now
+                self._slot = 0
+                deadline = now
+            else:
+                self._slot += 1
+                deadline = self._deadline(self._slot)
+                if now > deadline:
+                    # Behind schedule: take the latest slot that has passed, drop the ones before it
+                    self.overruns += 1
+                    self.overrun_ns += now - deadline
+                    behind = (now - deadline) // self.period_ns
+                    if behind:
+                        self.skipped_slots += behind
+                        self._slot += behind
+                        deadline = self._deadline(self._slot)
+
+        delay = deadline - time.monotonic_ns()
+        if delay > 0:
+            if stop_event is not None:
+                if stop_event.wait(delay / 1e9): return None
+            else:
+                time.sleep(delay / 1e9)
+        elif stop_event is not None and stop_event.is_set():
+            return None
+
+        lateness = max(0, time.monotonic_ns() - deadline)
+        with self._lock:
+            self.frames += 1
+            self.last_lateness_ns = lateness
+            self.max_lateness_ns = max(self.max_lateness_ns, lateness)
+        return deadline
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "fps": self.fps,
+                "frames": self.frames,
+                "skipped_slots": self.skipped_slots,
+                "overruns": self.overruns,
+                "overrun_ms": round(self.overrun_ns / 1e6, 3),
+                "max_lateness_ms": round(self.max_lateness_ns / 1e6, 3),
+            }
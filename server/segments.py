@@ -0,0 +1,101 @@
+import time
+
+
+def wall_time(monotonic_ts):
+    """Converts a time.monotonic() timestamp to wall-clock seconds since the epoch."""
+    return time.time() - (time.monotonic() - monotonic_ts)
+
+
+# ─────────────────────────────────────────────────────────
+# ROLLING SEGMENTS
+# ─────────────────────────────────────────────────────────
+class VideoSegment:
+    """
+    One encoded part of a recording session. Long sessions are cut into
+    segments so each part can be analysed while the rest is still being
+    recorded; index counts up within a session and the last part has
+    final set. A final segment may be empty when the session ended right
+    after a split (it only closes the session).
+    """
+
+    __slots__ = ("data", "session_id", "index", "final", "started_at", "ended_at", "frames", "spool_id")
+
+    def __init__(self, data, session_id, index, final, started_at=None, ended_at=None, frames=0):
+        self.data = data or b""
+        self.session_id = session_id
+        self.index = index
+        self.final = final
+        self.started_at = started_at
+        self.ended_at = ended_at
+        self.frames = frames
+        # Set when the bytes live in a SegmentSpool instead of data
+        self.spool_id = None
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        where = f"spool={self.spool_id}" if self.spool_id is not None else f"bytes={len(self.data)}"
+        return f"VideoSegment(session={self.session_id}, index={self.index}, final={self.final}, frames={self.frames}, {where})"
+
+
+class SegmentResult:
+    """
+    Analysis text for one segment, with the segment's place in its session and a result id (increasing).
+    error: why the analysis failed (text is None then).
+    """
+
+    __slots__ = ("id", "session_id", "index", "final", "started_at", "ended_at", "text", "error")
+
+    def __init__(self, segment, text, result_id=0, error=None):
+        self.id = result_id
+        self.session_id = segment.session_id
+        self.index = segment.index
+        self.final = segment.final
+        self.started_at = segment.started_at
+        self.ended_at = segment.ended_at
+        self.text = text
+        self.error = error
+
+
+def _clock(ts):
+    return time.strftime("%H:%M:%S", time.localtime(ts)) if ts else "?"
+
+
+def stitch_results(results, finished=()) -> list:
+    """
+    Joins segment analyses back into one report per session: [(session_id, report)], sessions and parts in order.
+    Sessions whose final segment has not been analysed yet are marked as in progress, or, for the
+    session ids in finished (final part analysed but not among results), as continuing elsewhere.
+    Parts whose analysis failed are listed as failed, unless they were analysed again.
+    """
+    sessions = {}
+    for result in results:
+        parts = sessions.setdefault(result.session_id, {})
+        # A part analysed again after a failure replaces the failure
+        if result.index not in parts or parts[result.index].error:
+            parts[result.index] = result
+
+    reports = []
+    for session_id, parts in sessions.items():
+        parts = sorted(parts.values(), key=lambda r: r.index)
+        texts = [r for r in parts if r.text or r.error]
+        if len(texts) == 1 and not texts[0].error and parts[-1].final and parts[0].index == 0:
+            reports.append((session_id, texts[0].text))
+            continue
+        lines = []
+        for part in texts:
+            heading = (f"[Session {session_id + 1}, part {part.index + 1}, "
+                       f"{_clock(part.started_at)}-{_clock(part.ended_at)}]")
+            if part.error:
+                lines.append(f"{heading}\nAnalysis failed: {part.error}")
+            else:
+                lines.append(f"{heading}\n{part.text}")
+        if not texts and parts[-1].final:
+            lines.append(f"[Session {session_id + 1} finished]")
+        if not parts[-1].final and session_id in finished:
+            lines.append(f"[Session {session_id + 1} continues in the next results]")
+        elif not parts[-1].final:
+            lines.append(f"[Session {session_id + 1} still recording: more parts will follow]")
+        reports.append((session_id, "\n\n".join(lines)))
+    return reports
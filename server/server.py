@@ -1,4 +1,3 @@
-import time
 import os
 import sys
 from dotenv import load_dotenv
@@ -12,37 +11,186 @@ if _server_dir not in sys.path:
 
 from mcp.server.fastmcp import FastMCP
 from video_engine import VideoEngine
-from twelvelabserver import analyze_video_from_ram
-import threading
+from twelvelabserver import analyze_video_from_ram, index_poller, warm_up
+from metrics import MetricsRegistry, MetricsExporter
+from segments import SegmentResult, stitch_results
+from analysis_pool import OrderedWorkerPool
+from analysis_cache import AnalysisCache
+from spool import SegmentSpool, SpoolMap
+import asyncio
+import json
+import traceback
+import uuid
+from collections import deque
+from contextlib import asynccontextmanager
+
+
+# The recorder / analysis task (one per process), and why it stopped if it crashed
+pipeline = None
+pipeline_error = None
+_lifespans = 0
+
+
+def _pipeline_done(task):
+    global pipeline_error
+    if task.cancelled() or task.exception() is None: return
+    error = task.exception()
+    pipeline_error = f"{type(error).__name__}: {error}"
+    print(f"[Engine] Recording pipeline stopped: {pipeline_error}")
+    traceback.print_exception(error)
+
+
+@asynccontextmanager
+async def lifespan(server):
+    """
+    Runs the recorder / analysis pipeline as a task on the server's event loop.
+    Streamable HTTP enters the lifespan once per client session: the sessions
+    share one pipeline, which stops when the last of them ends.
+    """
+    global pipeline, pipeline_error, _lifespans
+    if pipeline is None or pipeline.done():
+        pipeline_error = None
+        pipeline = asyncio.create_task(analysis_main())
+        pipeline.add_done_callback(_pipeline_done)
+    _lifespans += 1
+    try:
+        yield
+    finally:
+        _lifespans -= 1
+        if not _lifespans:
+            pipeline.cancel()
+            await asyncio.gather(pipeline, return_exceptions=True)
+
 
 # Define the server
-mcp = FastMCP("Visual Debugger")
+mcp = FastMCP("Visual Debugger", lifespan=lifespan)
+
+# Everything below is only touched from the event loop (tools and the analysis
+# task), so no locks: blocking work happens in executors and reports back here.
 status = False
-status_lock = threading.Lock()
 
-analysis_queue = []
-analysis_lock = threading.Lock()
+# Finished analyses, oldest first. Reads are non-destructive: each result has an
+# increasing id and callers page through them with since=<last id seen>. The newest
+# ANALYSIS_RETAIN results are kept.
+analysis_queue = deque(maxlen=int(os.getenv("ANALYSIS_RETAIN", "500")))
+last_result_id = 0
+# Notified whenever a result lands, for wait_for_visual_debug_data
+results_changed = asyncio.Condition()
+
+engine = None
+analysis_metrics = MetricsRegistry()
+analysis_metrics.gauge("analysis_queue", lambda: len(analysis_queue))
+analysis_metrics.gauge("index_poller", index_poller.stats)
+
+# Repeated recordings are answered from here instead of being uploaded again.
+# ANALYSIS_CACHE_SIMILARITY: below 1 (identical videos only), also reuse the analysis of
+# a near-duplicate whose least alike 4x16-cell tile has at least that share of matching
+# cells (see analysis_cache.signature_similarity). Re-encodes score 1.0, a moved caret
+# 0.97, an edit of a few characters 0.95 or less, so 0.99 accepts re-encodes only.
+# ANALYSIS_CACHE_PATH="" keeps the cache in memory only
+analysis_cache = AnalysisCache(
+    path=os.getenv("ANALYSIS_CACHE_PATH", os.path.expanduser("~/.cache/visual-debugger/analysis_cache.json")),
+    similarity=float(os.getenv("ANALYSIS_CACHE_SIMILARITY", "1")),
+    max_entries=int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "500")),
+    max_age=float(os.getenv("ANALYSIS_CACHE_MAX_AGE_DAYS", "7")) * 86400,
+    metrics=analysis_metrics,
+)
+analysis_metrics.gauge("analysis_cache", analysis_cache.stats)
+# Session ids can repeat across runs, so cache groups are per process
+_run_id = uuid.uuid4().hex
+
+# Encoded segments waiting for analysis and finished analyses are kept on disk in
+# RECORDER_SPOOL_PATH (up to RECORDER_SPOOL_MAX_MB of unanalysed video) and picked
+# up again after a restart; RECORDER_SPOOL_PATH="" keeps everything in memory
+_spool_path = os.getenv("RECORDER_SPOOL_PATH", os.path.expanduser("~/.cache/visual-debugger/spool"))
+spool = SegmentSpool(_spool_path, max_bytes=int(float(os.getenv("RECORDER_SPOOL_MAX_MB", "2048")) * 1024 * 1024),
+                     max_results=analysis_queue.maxlen) if _spool_path else None
+if spool is not None:
+    analysis_metrics.gauge("spool", spool.stats)
 
 @mcp.tool()
-def get_visual_debug_data() -> str:
+def get_visual_debug_data(since: int = 0, max_bytes: int = 16000) -> str:
     """
-    Gets the latest visual debugging data from screen recordings.
+    Gets visual debugging data from screen recordings, oldest first.
     Call this tool when you need to understand what the user is seeing on their screen
     or to get context about recent user interactions.
+    Pass since=<the cursor from the previous response> to get only newer results;
+    each response holds at most max_bytes of text and ends with the next cursor.
     """
-    with analysis_lock:
-        if len(analysis_queue) == 0:
-            return "No visual debugging data available. The user hasn't recorded any interactions yet."
-        else:
-            out = "Visual Debugging Data:\n\n"
-            for i, item in enumerate(analysis_queue, 1):
-                out += f"=== Interaction Session {i} ===\n"
-                out += item + "\n\n"
-            analysis_queue.clear()
-            with status_lock:
-                global status
-                status = False
-            return out
+    global status
+    expired = bool(analysis_queue) and analysis_queue[0].id > since + 1 and since > 0
+    header = "(Some results after this cursor have expired.)\n\n" if expired else ""
+    # Room for the note and the longest footer this page could get
+    reserved = len(header) + len(_footer(last_result_id, len(analysis_queue)))
+    results, cursor, remaining = read_results(since, max(1, max_bytes - reserved))
+    if not results:
+        if since:
+            return f"No new visual debugging data since cursor {since}."
+        if pipeline_error:
+            return f"No visual debugging data available: screen recording failed ({pipeline_error})."
+        return "No visual debugging data available. The user hasn't recorded any interactions yet."
+    if cursor >= last_result_id:
+        status = False
+    return header + format_results(results, max(1, max_bytes - reserved)) + _footer(cursor, remaining)
+
+
+def _footer(cursor, remaining):
+    footer = f"Next cursor: {cursor}"
+    if remaining:
+        footer += f" ({remaining} more results: call again with since={cursor})"
+    return footer
+
+
+@mcp.tool()
+async def wait_for_visual_debug_data(timeout_s: float = 30, since: int | None = None, max_bytes: int = 16000) -> str:
+    """
+    Waits until new visual debugging data arrives from screen recordings and returns it.
+    Without since, waits for the next analysis to finish; with since=<cursor>, returns right
+    away if there are already results after that cursor. Gives up after timeout_s seconds
+    (at most 600). Use this instead of calling check_visual_debug_status repeatedly.
+    """
+    if since is None:
+        since = last_result_id
+    timeout_s = min(max(timeout_s, 0), 600)
+    # A cancelled tool call simply cancels this wait
+    async with results_changed:
+        try:
+            await asyncio.wait_for(results_changed.wait_for(lambda: last_result_id > since), timeout=timeout_s)
+        except asyncio.TimeoutError:
+            return f"No new visual debugging data within {timeout_s:g} seconds (cursor {since})."
+    return get_visual_debug_data(since, max_bytes)
+
+
+def read_results(since, max_bytes):
+    """
+    Results with an id above since, oldest first, as many as fit in max_bytes of text
+    once formatted (at least one). Returns (results, next cursor, results left over).
+    """
+    pending = [r for r in analysis_queue if r.id > since]
+    finished = finished_sessions()
+    page = []
+    for result in pending:
+        if page and len(format_results(page + [result], finished=finished).encode()) > max_bytes: break
+        page.append(result)
+    cursor = page[-1].id if page else since
+    return page, cursor, len(pending) - len(page)
+
+
+def finished_sessions() -> set:
+    """Sessions whose final part has been analysed."""
+    return {r.session_id for r in analysis_queue if r.final}
+
+
+def format_results(results, max_bytes=None, finished=None) -> str:
+    out = "Visual Debugging Data:\n\n"
+    for session_id, item in stitch_results(results, finished_sessions() if finished is None else finished):
+        out += f"=== Interaction Session {session_id + 1} ===\n"
+        out += item + "\n\n"
+    if max_bytes and len(out.encode()) > max_bytes:
+        # A single result bigger than the whole budget
+        marker = "\n[... truncated]\n\n"
+        out = out.encode()[:max(0, max_bytes - len(marker))].decode(errors="ignore") + marker
+    return out
 
 
 @mcp.tool()
@@ -51,33 +199,140 @@ def check_visual_debug_status() -> str:
     Checks if new visual debugging data is available from screen recordings.
     Call this to see if the user has recorded new interactions that can be analyzed.
     """
-    with status_lock:
-        if status:
-            return "New visual debugging data is available. Use get_visual_debug_data to retrieve it."
-        return "No new visual debugging data available."
+    failed = f" Screen recording failed and is not running ({pipeline_error})." if pipeline_error else ""
+    if status:
+        return (f"New visual debugging data is available (latest cursor {last_result_id}). "
+                "Use get_visual_debug_data to retrieve it." + failed)
+    return "No new visual debugging data available." + failed
+
+
+
+def metrics_snapshot() -> dict:
+    return {
+        "recorder": engine.get_metrics() if engine is not None else None,
+        "pipeline_error": pipeline_error,
+        "analysis": analysis_metrics.snapshot(),
+    }
+
+
+@mcp.tool()
+def get_recorder_metrics() -> str:
+    """
+    Returns recorder and analysis performance metrics as JSON: capture / cursor / diff /
+    encode latency histograms, achieved vs target fps, dropped and duplicate frame counts,
+    queue depths, bytes held in memory, and upload / index / analyze latencies.
+    """
+    return json.dumps(metrics_snapshot(), indent=2, default=str)
+
+
+def analyze_segment(segment):
+    """Analyses one recorded segment (blocking, runs on the pool's executor); an empty final part only marks its session as over."""
+    data = spool.open(segment) if segment.spool_id is not None else segment.data
+    if not data: return None
+    try:
+        # Parts of one session look alike but show different work: never near-match them
+        return analysis_cache.get_or_compute(
+            data, lambda video: analyze_video_from_ram(video, metrics=analysis_metrics),
+            path=getattr(data, "name", None), group=f"{_run_id}:{segment.session_id}")
+    finally:
+        if isinstance(data, SpoolMap):
+            data.close()
+
+
+async def publish_result(segment, analysis_result, error):
+    """Called by the analysis pool in recording order."""
+    global status, last_result_id
+    if error:
+        analysis_metrics.incr("analyses_failed")
+        print(f"[Engine] Analysis failed: {error}")
+    elif analysis_result is not None:
+        analysis_metrics.incr("analyses_completed")
+    print(f"[Engine] Analysis complete ({segment}), updating queue.")
+    last_result_id += 1
+    analysis_queue.append(SegmentResult(segment, analysis_result, last_result_id,
+                                        error=f"{type(error).__name__}: {error}" if error else None))
+    # A failed segment stays pending in the spool, so the next start analyses it again
+    if segment.spool_id is not None and not error:
+        await asyncio.to_thread(spool.complete, segment, analysis_result, last_result_id)
+    status = True
+    async with results_changed:
+        results_changed.notify_all()
 
-        
-def async_main() -> None:
+
+async def analysis_main() -> None:
     """
     Asynchronously updates the analysis queue with new data.
     """
-    engine = VideoEngine()
-    while True:
-        if engine.check_video():
+    global engine, last_result_id
+    loop = asyncio.get_running_loop()
+    # Connect to TwelveLabs and resolve the index while the recorder starts up
+    loop.run_in_executor(None, warm_up, False)
+
+    # Segments waiting for analysis, in recording order (on disk when spooled)
+    pending = asyncio.Queue()
+    first_session_id = 0
+    if spool is not None:
+        # Pick up where a previous run stopped: its results, and segments it never analysed
+        segments, results = await asyncio.to_thread(spool.recover)
+        # A pipeline restarted for a new client already holds the earlier results
+        analysis_queue.extend(r for r in results if r.id > last_result_id)
+        last_result_id = max([last_result_id] + [r.id for r in results])
+        for segment in segments:
+            pending.put_nowait(segment)
+        first_session_id = await asyncio.to_thread(spool.next_session_id)
+        if segments or results:
+            print(f"[Engine] Recovered {len(segments)} unanalysed segments and {len(results)} results from {spool.path}")
+
+    engine = await asyncio.to_thread(VideoEngine, first_session_id=first_session_id)
+    # Up to ANALYSIS_WORKERS videos are uploaded, indexed and analysed at once;
+    # results still land in analysis_queue in recording order
+    pool = OrderedWorkerPool(analyze_segment, workers=int(os.getenv("ANALYSIS_WORKERS", "3")),
+                             on_result=publish_result)
+    analysis_metrics.gauge("analysis_pool", pool.stats)
+
+    async def receive():
+        # Recorder -> spool: moves each video out of memory as soon as it is handed over
+        while True:
+            # The wait happens on an executor thread and returns as soon as the recorder
+            # hands over a video; the timeout only bounds how long a shutdown can take
+            segment = await asyncio.to_thread(engine.get_video, 1.0)
+            if segment is None:
+                if not engine.recording_thread.is_alive() and not engine.check_video(): break
+                continue
             print("[Engine] Video ready for processing.")
-            video_bytes = engine.get_video()
-            # Here you would process the video bytes as needed
-            # For this example, we just print the size
-            analysis_result = analyze_video_from_ram(video_bytes)
-            with analysis_lock:
-                print("[Engine] Analysis complete, updating queue.")
-                analysis_queue.append(analysis_result)
-            with status_lock:
-                global status
-                status = True
-        time.sleep(1)
+            if spool is not None:
+                segment = await asyncio.to_thread(spool.put, segment)
+            pending.put_nowait(segment)
+        pending.put_nowait(None)
+
+    receiver = asyncio.create_task(receive())
+    try:
+        while True:
+            segment = await pending.get()
+            if segment is None: break
+            # Evicted from a full spool while it waited
+            if segment.spool_id is not None and not spool.contains(segment): continue
+            # Waits while every worker is busy
+            await pool.submit(segment)
+        # The recorder only stops on its own when capture failed
+        raise engine.error or RuntimeError("Screen recording stopped unexpectedly")
+    finally:
+        # Keep the session being recorded: stop the recorder and let it close the session
+        # out while the receiver (not cancelled, so nothing it took is dropped) spools what
+        # it hands over; spool anything still left once the receiver is done
+        engine.recorder.stop()
+        await asyncio.to_thread(engine.recording_thread.join)
+        await asyncio.gather(receiver, return_exceptions=True)
+        if spool is not None:
+            for segment in engine.video_queue.drain():
+                await asyncio.to_thread(spool.put, segment)
+        await pool.aclose()
 
 if __name__ == "__main__":
-    # Runs on stdio by default, perfect for local MCP integration
-    threading.Thread(target=async_main, daemon=True).start()
+    # Runs on stdio by default, perfect for local MCP integration; the recorder and
+    # analysis pipeline start with the server (see lifespan)
+    # Optional periodic JSON snapshot of get_recorder_metrics for dashboards / offline comparison
+    if os.getenv("RECORDER_METRICS_PATH"):
+        MetricsExporter(metrics_snapshot, os.getenv("RECORDER_METRICS_PATH"),
+                        interval=float(os.getenv("RECORDER_METRICS_INTERVAL", "10"))).start()
     mcp.run()
\ No newline at end of file
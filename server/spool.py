@@ -0,0 +1,197 @@
+import glob
+import json
+import mmap
+import os
+import threading
+from collections import OrderedDict
+
+from segments import SegmentResult, VideoSegment
+
+
+class SpoolMap(mmap.mmap):
+    """Read-only memory map of a spooled MP4. Its name (the file path) lets it stand in for an upload file object."""
+
+
+def map_file(path):
+    with open(path, "rb") as f:
+        mapped = SpoolMap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    mapped.name = path
+    return mapped
+
+
+# ─────────────────────────────────────────────────────────
+# SEGMENT SPOOL
+# ─────────────────────────────────────────────────────────
+class SegmentSpool:
+    """
+    Keeps encoded segments waiting for analysis, and the finished analyses,
+    in a directory instead of process memory, so a backlog costs disk space
+    rather than RAM and survives a crash or restart.
+
+        <seq>.mp4    the segment, deleted once it has been analysed
+        <seq>.json   its metadata; the analysis text is added when done
+
+    Segments are memory-mapped only while being analysed (open / close).
+    Unanalysed segments beyond max_bytes are evicted oldest first; only the
+    newest max_results analyses are kept. recover() returns what a previous
+    run left behind: unanalysed segments to queue again and finished results.
+    """
+
+    def __init__(self, path, max_bytes=2 * 1024 ** 3, max_results=500):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_results = max_results
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._pending = OrderedDict()   # seq -> MP4 bytes on disk, oldest first
+        self._results = []              # seqs of finished analyses, oldest first
+        self._seq = 0
+
+        self.evicted = 0
+        self.evicted_bytes = 0
+        self.recovered = 0
+
+    def _file(self, seq, ext):
+        return os.path.join(self.path, f"{seq:08d}.{ext}")
+
+    def _write_meta(self, seq, meta):
+        tmp_path = self._file(seq, "json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._file(seq, "json"))
+
+    def _remove(self, seq, *exts):
+        for ext in exts:
+            try:
+                os.remove(self._file(seq, ext))
+            except FileNotFoundError:
+                pass
+
+    def put(self, segment) -> VideoSegment:
+        """Writes a segment to disk; returns a copy without the bytes that refers to the spooled file."""
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+        size = len(segment.data)
+        if size:
+            tmp_path = self._file(seq, "mp4.tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(segment.data)
+            os.replace(tmp_path, self._file(seq, "mp4"))
+        meta = {
+            "session_id": segment.session_id, "index": segment.index, "final": segment.final,
+            "started_at": segment.started_at, "ended_at": segment.ended_at, "frames": segment.frames,
+            "bytes": size, "analysed": False,
+        }
+        self._write_meta(seq, meta)
+        with self._lock:
+            self._pending[seq] = size
+            self._evict()
+        return self._segment(seq, meta)
+
+    @staticmethod
+    def _segment(seq, meta):
+        segment = VideoSegment(b"", meta["session_id"], meta["index"], meta["final"], meta["started_at"],
+                               meta["ended_at"], meta["frames"])
+        segment.spool_id = seq
+        return segment
+
+    def _evict(self):
+        total = sum(self._pending.values())
+        while self.max_bytes and total > self.max_bytes and len(self._pending) > 1:
+            seq, size = self._pending.popitem(last=False)
+            self._remove(seq, "mp4", "json")
+            total -= size
+            self.evicted += 1
+            self.evicted_bytes += size
+            print(f"[Engine] Spool over {self.max_bytes >> 20} MB, evicted unanalysed segment {seq}")
+
+    def contains(self, segment) -> bool:
+        """False once the segment has been evicted (or finished)."""
+        with self._lock:
+            return segment.spool_id in self._pending
+
+    def open(self, segment):
+        """Memory-maps the segment's MP4 for analysis (b"" for an empty part). close() it when done."""
+        with self._lock:
+            size = self._pending.get(segment.spool_id)
+        if not size: return b""
+        return map_file(self._file(segment.spool_id, "mp4"))
+
+    def complete(self, segment, text=None, result_id=None):
+        """Records the analysis (result_id None: nothing to keep) and deletes the MP4."""
+        seq = segment.spool_id
+        with self._lock:
+            self._pending.pop(seq, None)
+        self._remove(seq, "mp4")
+        if result_id is None:
+            self._remove(seq, "json")
+            return
+        meta = {
+            "session_id": segment.session_id, "index": segment.index, "final": segment.final,
+            "started_at": segment.started_at, "ended_at": segment.ended_at, "frames": segment.frames,
+            "analysed": True, "text": text, "result_id": result_id,
+        }
+        self._write_meta(seq, meta)
+        with self._lock:
+            self._results.append(seq)
+            expired = self._results[:-self.max_results] if self.max_results else []
+            del self._results[:len(expired)]
+        for old in expired:
+            self._remove(old, "json")
+
+    def recover(self):
+        """
+        Loads what a previous run left in the directory (forgetting anything tracked so
+        far). Returns (segments still to analyse, finished SegmentResults), both oldest first.
+        """
+        segments, results = [], []
+        with self._lock:
+            self._pending.clear()
+            del self._results[:]
+        for tmp_path in glob.glob(os.path.join(self.path, "*.tmp")):
+            os.remove(tmp_path)
+        for meta_path in sorted(glob.glob(os.path.join(self.path, "*.json"))):
+            seq = int(os.path.basename(meta_path).split(".")[0])
+            try:
+                with open(meta_path) as f:
+                    meta = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"[Engine] Skipping unreadable spool entry {meta_path}: {e}")
+                continue
+            self._seq = max(self._seq, seq)
+            segment = self._segment(seq, meta)
+            if meta["analysed"]:
+                results.append(SegmentResult(segment, meta["text"], meta["result_id"]))
+                self._results.append(seq)
+            elif not meta["bytes"] or os.path.exists(self._file(seq, "mp4")):
+                self._pending[seq] = meta["bytes"]
+                segments.append(segment)
+            else:
+                self._remove(seq, "json")
+        self.recovered = len(segments)
+        return segments, results
+
+    def next_session_id(self) -> int:
+        """A session id above every session already in the spool, so a new run does not reuse one."""
+        sessions = []
+        for meta_path in glob.glob(os.path.join(self.path, "*.json")):
+            try:
+                with open(meta_path) as f:
+                    sessions.append(json.load(f)["session_id"])
+            except (OSError, ValueError, KeyError):
+                continue
+        return max(sessions, default=-1) + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "path": self.path,
+                "pending": len(self._pending),
+                "pending_bytes": sum(self._pending.values()),
+                "max_bytes": self.max_bytes,
+                "results": len(self._results),
+                "evicted": self.evicted,
+                "evicted_bytes": self.evicted_bytes,
+                "recovered": self.recovered,
+            }
@@ -1,78 +1,146 @@
 import os
 import io
-import time
 import json
+import threading
 from twelvelabs import TwelveLabs
 from twelvelabs.types import ResponseFormat
+from contextlib import nullcontext
+from index_poller import IndexStatusPoller
 
 
-def analyze_video_from_ram(video_bytes: bytes, timeout_seconds: int = 300):
-    api_key = os.getenv("TL_API_KEY")
-    tl_id = os.getenv("TL_ID")
-    #if not api_key:
-    #    raise RuntimeError("TL_API_KEY is not set in the environment")
+def _timer(metrics, name):
+    return metrics.timer(name) if metrics is not None else nullcontext()
 
-    client = TwelveLabs(api_key=api_key)
 
-    # 1. Wrap the raw bytes in a file-like object
-    video_stream = io.BytesIO(video_bytes)
-    # Important: Give it a name so the SDK/API knows the file extension
-    video_stream.name = "recording.mp4"
-    # Ensure the stream is at the start
-    #video_stream.seek(0)
-
-    # 2. Use existing index from TL_ID, or create one if not set
-    if not tl_id:
+INDEX_NAME = "RAM-Debug-Index"
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Returns the process-wide TwelveLabs client, created on first use so its HTTP connections are reused."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = TwelveLabs(api_key=os.getenv("TL_API_KEY"))
+        return _client
+
+
+class IndexResolver:
+    """
+    Works out which index to upload into, once: TL_ID if set, otherwise the
+    RAM-Debug-Index (created on first use, or looked up if it already exists).
+    The id is cached until invalidate() is called after an index error.
+    """
+
+    def __init__(self, name=INDEX_NAME):
+        self.name = name
+        self.resolutions = 0
+        self._index_id = None
+        self._lock = threading.Lock()
+
+    def get(self, client) -> str:
+        with self._lock:
+            if self._index_id is None:
+                self._index_id = self._resolve(client)
+                self.resolutions += 1
+            return self._index_id
+
+    def invalidate(self):
+        with self._lock:
+            self._index_id = None
+
+    def _resolve(self, client):
+        tl_id = os.getenv("TL_ID")
+        if tl_id: return tl_id
         try:
             index = client.indexes.create(
-                index_name="RAM-Debug-Index",
+                index_name=self.name,
                 models=[{"model_name": "pegasus1.2", "model_options": ["visual"]}]
             )
-            tl_id = index.id
+            return index.id
         except Exception as e:
             # Index might already exist, try to find it
             if "already_exists" in str(e):
-                indexes = client.indexes.list()
-                for idx in indexes:
-                    if idx.index_name == "RAM-Debug-Index":
-                        tl_id = idx.id
-                        break
-            if not tl_id:
-                raise e
+                for idx in client.indexes.list():
+                    if idx.index_name == self.name:
+                        return idx.id
+            raise e
+
+
+index_resolver = IndexResolver()
+index_poller = IndexStatusPoller(get_client)
+
+
+def warm_up(background=True):
+    """Creates the client and resolves the index ahead of the first upload (in a daemon thread by default)."""
+    if background:
+        threading.Thread(target=warm_up, args=(False,), daemon=True).start()
+        return
+    try:
+        index_resolver.get(get_client())
+    except Exception as e:
+        # Not fatal: the first analysis retries the lookup
+        print(f"TwelveLabs warm-up failed: {e}")
+
+
+def analyze_video_from_ram(video_bytes: bytes, timeout_seconds: int = 300, metrics=None):
+    """
+    Uploads, indexes and analyzes an MP4 held in memory and returns the summary.
+    video_bytes may also be a readable binary file object with an .mp4 name (e.g. a
+    spool memory map), which is uploaded in place without copying it into memory.
+    If a MetricsRegistry is given, upload / index / analyze latencies are recorded in it.
+    """
+    #if not os.getenv("TL_API_KEY"):
+    #    raise RuntimeError("TL_API_KEY is not set in the environment")
+
+    client = get_client()
+
+    # 1. Wrap the raw bytes in a file-like object
+    owns_stream = not hasattr(video_bytes, "read")
+    if owns_stream:
+        video_stream = io.BytesIO(video_bytes)
+        # Important: Give it a name so the SDK/API knows the file extension
+        video_stream.name = "recording.mp4"
+    else:
+        video_stream = video_bytes
+        # Ensure the stream is at the start
+        video_stream.seek(0)
+
+    # 2. Use existing index from TL_ID, or create one if not set (resolved once, see IndexResolver)
+    tl_id = index_resolver.get(client)
 
     print("Uploading recording from RAM...")
 
     try:
         # 3. Upload directly from the BytesIO stream
-        asset = client.assets.create(
-            method="direct",
-            file=video_stream  # The SDK reads from RAM here
-        )
+        with _timer(metrics, "analysis_upload"):
+            asset = client.assets.create(
+                method="direct",
+                file=video_stream  # The SDK reads from RAM here
+            )
 
         # 4. Indexing & Polling with timeout and backoff
-        indexed_asset = client.indexes.indexed_assets.create(
-            index_id=tl_id,
-            asset_id=asset.id
-        )
-
-        start_time = time.time()
-        sleep_seconds = 1
-        while True:
-            status_check = client.indexes.indexed_assets.retrieve(
-                index_id=tl_id,
-                indexed_asset_id=indexed_asset.id
-            )
-            if getattr(status_check, "status", None) == "ready":
-                break
-            if time.time() - start_time > timeout_seconds:
-                raise TimeoutError(f"Indexing timed out after {timeout_seconds} seconds")
-            time.sleep(sleep_seconds)
-            sleep_seconds = min(sleep_seconds * 2, 10)
+        with _timer(metrics, "analysis_index"):
+            try:
+                indexed_asset = client.indexes.indexed_assets.create(
+                    index_id=tl_id,
+                    asset_id=asset.id
+                )
+            except Exception:
+                # The cached index may have been deleted: look it up again next time
+                index_resolver.invalidate()
+                raise
+
+            # Shared poller: wakes this upload as soon as its asset is ready
+            index_poller.wait_ready(tl_id, indexed_asset.id, timeout_seconds)
 
         # 5. Analysis
-        analysis = client.analyze(
-            video_id=indexed_asset.id,
-            prompt=
+        with _timer(metrics, "analysis_analyze"):
+            analysis = client.analyze(
+                video_id=indexed_asset.id,
+                prompt=
             """
             Your purpose is to be an observer and provide context based on a video you are given.
             Give a detailed summary of the video content and and explain in a step by step process what is happening. 
@@ -81,23 +149,24 @@ def analyze_video_from_ram(video_bytes: bytes, timeout_seconds: int = 300):
             Do NOT mention the mouse color changing at all, only use the information about the cursor changing color as information for yourself.
             Also, do NOT make any assumptions about anything not clearly shown in the video, no assumptions should be made about anything. 
             """,
-            response_format=ResponseFormat(
-                json_schema={
-                    "type": "object",
-                    "properties": {
-                        "summary": {"type": "string"},
-                        "code_fix": {"type": "string"}
+                response_format=ResponseFormat(
+                    json_schema={
+                        "type": "object",
+                        "properties": {
+                            "summary": {"type": "string"},
+                            "code_fix": {"type": "string"}
+                        },
                     },
-                },
-            ),
-        )
+                ),
+            )
 
         analysis = json.loads(analysis.data) if analysis.data else {}
         analysis = analysis.get('summary')
         return analysis
     finally:
         try:
-            video_stream.close()
+            if owns_stream:
+                video_stream.close()
         except Exception:
             pass
 
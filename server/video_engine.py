@@ -1,53 +1,154 @@
 import time
 import threading
-import numpy as np
-import Quartz
 from io import BytesIO
 from typing import Optional
 import sys
 import os
 import subprocess
-
-# GUI Dependencies
-import tkinter as tk
-from tkinter import Canvas, Frame, Scrollbar
-from PIL import Image, ImageDraw
+import zlib
+from collections import deque
 
 # Media/Input Dependencies
 import imageio.v3 as iio
-from pynput import keyboard, mouse
-from pynput.mouse import Controller as MouseController
-from screenmanager.screenmanager import pick_window
+try:
+    from pynput import keyboard, mouse
+    from pynput.mouse import Controller as MouseController
+except Exception:
+    # No input devices on headless machines (CI, servers): run without listeners
+    keyboard = mouse = MouseController = None
+from frame_source import QuartzFrameSource, create_frame_source
+from encoder import StreamingEncoder, profile_args, resolve_profile
+from pipeline import FrameQueue, QueueClosed, VideoChannel, SESSION_FINISH, SESSION_DISCARD, SEGMENT_SPLIT
+from frame_ring import FrameRing
+from activity import LumaBlockDetector
+from cursor import CursorCompositor, CursorTrack, WindowBoundsCache
+from metrics import MetricsRegistry
+from scheduler import FrameScheduler
+from governor import CaptureGovernor
+from scaling import FrameScaler
+from segments import VideoSegment, wall_time
 
 
 # ─────────────────────────────────────────────────────────
-# 2. THE RECORDER (Quartz Engine)
+# 2. THE RECORDER (Quartz / mss / synthetic sources)
 # ─────────────────────────────────────────────────────────
 class IdleScreenRecorder:
-    def __init__(self, idle_seconds=5, max_duration=300, fps=10, target_window_id=None):
+    def __init__(self, idle_seconds=5, max_duration=300, fps=10, target_window_id=None, streaming=True,
+                 detect_queue_size=None, detect_queue_policy="drop_oldest",
+                 encode_queue_size=None, encode_queue_policy="drop_newest",
+                 frame_buffer_bytes=256 * 1024 * 1024, frame_buffer_path=None,
+                 activity_detector=None, drop_duplicates=True, window_bounds_refresh=0.5,
+                 cursor_mode="deferred", source=None, pixel_format="rgb24", metrics=None,
+                 idle_probe_fps=2, cpu_budget=None, max_dimension=None, max_pixels=None,
+                 encoder_profile=None, segment_seconds=None, scene_change_ratio=None,
+                 min_segment_seconds=5, first_session_id=0):
         self.idle_seconds = idle_seconds
         self.max_duration = max_duration
         self.fps = fps
+        # Streaming mode pipes frames into ffmpeg as they are captured instead of
+        # holding the whole session in RAM and encoding it at the end.
+        self.streaming = streaming
+        # x264 settings by name, see encoder.ENCODER_PROFILES ("fast-upload", "small", "archival")
+        self.encoder_profile = resolve_profile(encoder_profile)
+        # Skip frames byte-identical to the previous one. Videos are always encoded as
+        # variable frame rate from the real capture timestamps (the capture rate itself
+        # varies with idle probing and the CPU budget).
+        self.drop_duplicates = drop_duplicates
+        self.duplicate_frames = 0
+        # Rolling segments: an active session is cut into separately encoded parts every
+        # segment_seconds, or at a scene change (change ratio >= scene_change_ratio, no
+        # sooner than min_segment_seconds), so analysis can start before the session ends
+        self.segment_seconds = segment_seconds
+        self.scene_change_ratio = scene_change_ratio
+        self.min_segment_seconds = min_segment_seconds
+        self._session_id = first_session_id
+        self._segment_index = 0
+
+        # Stage queues: capture -> detect -> encode. Sizes are in frames
+        # (defaults: 2s in front of the detector, 30s in front of the encoder).
+        self.detect_queue_size = detect_queue_size or fps * 2
+        self.detect_queue_policy = detect_queue_policy
+        self.encode_queue_size = encode_queue_size or fps * 30
+        self.encode_queue_policy = encode_queue_policy
+        self._detect_queue = None
+        self._encode_queue = None
+        self._stop_event = threading.Event()
+        # The exception that ended the last recording, if capture failed
+        self.error = None
+        # Capture cadence: absolute monotonic deadlines, missed slots are skipped
+        self._scheduler = FrameScheduler(fps)
+        # Capture rate, resolution and detection frequency: idle_probe_fps while nothing
+        # happens, fps once activity is seen, scaled down to stay within cpu_budget cores
+        self._governor = CaptureGovernor(fps, probe_fps=idle_probe_fps, cpu_budget=cpu_budget,
+                                         cpu_time=self._cpu_time)
+
+        # Every in-flight frame lives in this preallocated ring. In streaming mode it
+        # only has to cover frames queued ahead of the encoder; encode-at-end sessions
+        # are also capped to what fits in it.
+        self._ring = FrameRing(frame_buffer_bytes, mmap_path=frame_buffer_path)
         self._last_activity_time = time.time()
         self._activity_lock = threading.Lock()
         
+        # "rgb24": frames are converted to RGB while copied into the frame ring.
+        # "bgra": frames stay in the source's native BGRA; with streaming, fresh capture
+        # buffers are handed to ffmpeg untouched (stride padding included) and cropping
+        # and colour conversion happen inside ffmpeg.
+        if pixel_format not in ("rgb24", "bgra"):
+            raise ValueError(f"Unknown pixel_format '{pixel_format}'")
+        self.pixel_format = pixel_format
+        channel_order = "bgr" if pixel_format == "bgra" else "rgb"
+
+        # Optional size cap (longest side / total pixels), applied while frames are
+        # copied into the frame ring so memory, encode and upload all shrink with it
+        self._scaler = FrameScaler(max_dimension=max_dimension, max_pixels=max_pixels)
+        # Frame pixels per window pixel, for placing the cursor on downscaled frames
+        self._frame_scale = 1.0
+
+        # Where frames come from (Quartz window by default, see frame_source.py)
+        if source is None and target_window_id:
+            source = QuartzFrameSource(target_window_id)
+        self.source = source
+
         # Tools for cursor visualization
-        self.mouse_controller = MouseController()
+        self.mouse_controller = MouseController() if MouseController else None
         # Default cursor color
         self.cursor_color = "white"
+        # "burn": draw into each frame at capture time
+        # "deferred": log a cursor track at capture, composite only at encode time
+        # "none": cursor-free export
+        if cursor_mode not in ("burn", "deferred", "none"):
+            raise ValueError(f"Unknown cursor_mode '{cursor_mode}'")
+        self.cursor_mode = cursor_mode
+        self._cursor = CursorCompositor(channel_order=channel_order)
+        self._cursor_track = CursorTrack()
+        self._window_bounds = WindowBoundsCache(self._lookup_window_origin, refresh_interval=window_bounds_refresh)
 
         self._key_listener = None
         self._mouse_listener = None
         
-        # Visual Activity Tracking
-        self.prev_gray_frame = None
+        # Visual Activity Tracking (any ActivityDetector; thresholds live on the detector)
+        self.activity_detector = activity_detector or LumaBlockDetector(channel_order=channel_order)
         
         self._frames = []
+        self._frame_count = 0
+        self._last_frame_time = None
+        self._segment_start_time = None
+        self._last_capture_shape = None
+        self._encoder = None
         self._video_buffer = None
         self._recording_duration = 0.0
         self._stopped_reason = None
         self.target_window_id = target_window_id
 
+        # Finished segments and sessions, newest last: frames, MP4 size and how long the
+        # video took to become ready after the detect stage cut it off
+        self.session_log = deque(maxlen=50)
+        self._session_cutoffs = deque()
+
+        # Hot-path timings, counters and gauges (see get_metrics)
+        self.metrics = metrics or MetricsRegistry()
+        self._register_gauges()
+
     def _mark_activity(self):
         """Updates the timer when activity happens."""
         with self._activity_lock:
@@ -64,8 +165,12 @@ class IdleScreenRecorder:
                 self.cursor_color = "#FF0000" # Red
             else:
                 self.cursor_color = "blue"
+        if self.cursor_mode == "deferred":
+            # Log the click right away so presses shorter than a frame still show up
+            self._record_cursor(time.monotonic(), (x, y))
 
     def _start_listeners(self):
+        if keyboard is None or mouse is None: return
         # 1. Keyboard: Resets idle timer
         self._key_listener = keyboard.Listener(on_press=lambda *a: self._mark_activity())
         self._key_listener.start()
@@ -78,75 +183,99 @@ class IdleScreenRecorder:
         if self._key_listener: self._key_listener.stop()
         if self._mouse_listener: self._mouse_listener.stop()
 
-    def _draw_cursor_on_frame(self, img_rgb, width, height):
-        try:
-            # 1. Get Window Position
-            win_info_list = Quartz.CGWindowListCopyWindowInfo(Quartz.kCGWindowListOptionIncludingWindow, self.target_window_id)
-            if not win_info_list: return img_rgb
-            bounds = win_info_list[0].get('kCGWindowBounds', {})
-            win_x = bounds.get('X', 0)
-            win_y = bounds.get('Y', 0)
+    def _lookup_window_origin(self):
+        if self.source is None: return None
+        return self.source.window_origin()
 
-            # 2. Get Mouse Position
-            gx, gy = self.mouse_controller.position
-            rx = int(gx - win_x)
-            ry = int(gy - win_y)
-
-            # 3. Draw Triangle if inside
-            if 0 <= rx < width and 0 <= ry < height:
-                pil_img = Image.fromarray(img_rgb)
-                draw = ImageDraw.Draw(pil_img)
-                
-                # Triangle Geometry
-                triangle_points = [
-                    (rx, ry),           # Top
-                    (rx - 8, ry + 18),  # Bottom Left
-                    (rx + 8, ry + 18)   # Bottom Right
-                ]
-                
-                # Fill based on click state
-                draw.polygon(triangle_points, fill=self.cursor_color, outline='black')
-                
-                return np.array(pil_img)
+    def _cursor_position(self):
+        """Global cursor position from the frame source if it has one, else from the OS pointer."""
+        position = self.source.cursor_position() if self.source else None
+        if position is None and self.mouse_controller:
+            position = self.mouse_controller.position
+        return position
 
+    def _record_cursor(self, timestamp, position=None):
+        """Appends the current cursor position (window coordinates) and click colour to the cursor track."""
+        try:
+            origin = self._window_bounds.get()
+            if origin is None: return
+            position = position or self._cursor_position()
+            if position is None: return
+            gx, gy = position
+            # In frame pixels, which are fewer than window pixels when frames are downscaled
+            scale = self._frame_scale
+            self._cursor_track.record(timestamp, int((gx - origin[0]) * scale), int((gy - origin[1]) * scale),
+                                      self.cursor_color)
         except Exception as e:
-            # Don't crash on drawing errors
+            # Don't crash on cursor lookup errors
             pass
-            
-        return img_rgb
 
-    def _capture_frame(self):
-        if not self.target_window_id: return None
-        image_ref = Quartz.CGWindowListCreateImage(
-            Quartz.CGRectNull,
-            Quartz.kCGWindowListOptionIncludingWindow,
-            self.target_window_id,
-            Quartz.kCGWindowImageBoundsIgnoreFraming | Quartz.kCGWindowImageNominalResolution
-        )
-        if not image_ref: return None
+    def _paint_cursor(self, frame, x, y, color):
+        """Draws the cursor into a frame slot: in place, or as a row patch if the buffer is read-only."""
+        height, width = frame.array.shape[:2]
+        if not (0 <= x < width and 0 <= y < height): return
+        if frame.array.flags.writeable:
+            self._cursor.blit(frame.array, x, y, color)
+            return
+        # Borrowed capture buffer: copy only the rows under the sprite and let the
+        # encoder splice them in
+        top, bottom = self._cursor.rows_spanned(y, color)
+        top, bottom = max(0, top), min(height, bottom)
+        rows = frame.buffer[top:bottom].copy()
+        self._cursor.blit(rows[:, :width], x, y - top, color)
+        frame.patch = (top, rows)
+
+    def _composite_cursor(self, frame):
+        """Paints the cursor from the track onto a frame slot at its capture time (deferred mode)."""
+        sample = self._cursor_track.sample_at(frame.timestamp)
+        if sample is not None:
+            x, y, color = sample
+            self._paint_cursor(frame, x, y, color)
+
+    def _draw_cursor_on_frame(self, frame):
+        try:
+            # 1. Get Window Position (cached, refreshed on a slower cadence)
+            origin = self._window_bounds.get()
+            if origin is None: return
+            win_x, win_y = origin
 
-        w = Quartz.CGImageGetWidth(image_ref)
-        h = Quartz.CGImageGetHeight(image_ref)
-        bpr = Quartz.CGImageGetBytesPerRow(image_ref)
-        
-        pixel_data = Quartz.CGDataProviderCopyData(Quartz.CGImageGetDataProvider(image_ref))
-        buff = np.frombuffer(pixel_data, dtype=np.uint8)
-        
-        expected_len = h * bpr
-        buff = buff[:expected_len].reshape((h, bpr))
-        buff = buff[:, :w*4] 
-        
-        img = buff.reshape((h, w, 4))
-        img = img[:, :, :3] # Drop Alpha
-        img_rgb = img[:, :, [2, 1, 0]] # BGRA -> RGB
+            # 2. Get Mouse Position
+            position = self._cursor_position()
+            if position is None: return
+            gx, gy = position
+            rx = int((gx - win_x) * self._frame_scale)
+            ry = int((gy - win_y) * self._frame_scale)
 
-        img_with_cursor = self._draw_cursor_on_frame(img_rgb, w, h)
+            # 3. Blit the sprite for the current click state
+            self._paint_cursor(frame, rx, ry, self.cursor_color)
 
-        h_even = h - (h % 2)
-        w_even = w - (w % 2)
-        return img_with_cursor[:h_even, :w_even, :]
+        except Exception as e:
+            # Don't crash on drawing errors
+            pass
 
-    def record_until_idle(self, video_queue, queue_lock) -> None:
+    def _capture_frame(self):
+        if self.source is None: return None
+        frame_shape = self._last_capture_shape
+        step = self._governor.scale_step
+        if self.pixel_format == "bgra":
+            # Zero-copy when streaming: the slot borrows the capture buffer itself
+            slot = self.source.grab_bgra(self._ring, borrow=self.streaming, step=step, scaler=self._scaler)
+        else:
+            slot = self.source.grab(self._ring, step=step, scaler=self._scaler)
+        if slot is None: return None
+        if self.source.native_size:
+            self._frame_scale = slot.array.shape[1] / self.source.native_size[1]
+        self._last_capture_shape = slot.array.shape
+        if frame_shape is not None and slot.array.shape != frame_shape:
+            # Window was resized: its origin has probably moved as well
+            self._window_bounds.invalidate()
+
+        if self.cursor_mode == "burn":
+            with self.metrics.timer("cursor"):
+                self._draw_cursor_on_frame(slot)
+        return slot
+
+    def record_until_idle(self, video_queue) -> None:
         # # 1. TRIGGER THE GUI HERE
         # print("[Recorder] Launching GUI Selector...")
         # try:
@@ -172,90 +301,411 @@ class IdleScreenRecorder:
 
         # 2. START RECORDING
         self._frames = []
+        self._frame_count = 0
+        self._encoder = None
         self._video_buffer = None
+        self._stop_event.clear()
+        self.error = None
         self._mark_activity()
         # self._start_listeners()
-        
+
         # Reset visual tracker
-        self.prev_gray_frame = None
-        idling = True
-        
+        self.activity_detector.reset()
+
+        # Capture -> detect -> encode, connected by bounded queues so a slow
+        # encode never stalls the capture cadence.
+        self._detect_queue = FrameQueue(self.detect_queue_size, policy=self.detect_queue_policy, name="detect",
+                                        on_drop=self._release_frame)
+        self._encode_queue = FrameQueue(self.encode_queue_size, policy=self.encode_queue_policy, name="encode",
+                                        on_drop=self._release_frame)
+        stages = [
+            threading.Thread(target=self._detect_stage, name="recorder-detect", daemon=True),
+            threading.Thread(target=self._encode_stage, args=(video_queue,), name="recorder-encode", daemon=True),
+        ]
+        for stage in stages:
+            stage.start()
+
         print(f"[Recorder] Recording... (Stop by not acting for {self.idle_seconds}s)")
 
+        try:
+            self._capture_stage()
+        # finally:
+        #     self._stop_listeners()
+        except Exception as e:
+            print(f"[Recorder] Recording Error: {e}")
+            self.error = e
+        finally:
+            self._detect_queue.close()
+            for stage in stages:
+                stage.join()
+
+    def stop(self):
+        """Stops the capture loop; queued frames are drained and the open session is closed out."""
+        self._stop_event.set()
+
+    def get_metrics(self) -> dict:
+        """Snapshot of stage latency histograms, frame counters, fps, queue depths and memory use."""
+        return self.metrics.snapshot()
+
+    def _register_gauges(self):
+        m = self.metrics
+        m.gauge("target_fps", lambda: self.fps)
+        m.gauge("achieved_fps", lambda: m.rate("captured").rate())
+        m.gauge("encoded_fps", lambda: m.rate("encoded").rate())
+        m.gauge("duplicate_frames", lambda: self.duplicate_frames)
+        m.gauge("last_change_ratio", lambda: self.activity_detector.last_stats.get("change_ratio"))
+        m.gauge("pipeline", self.get_pipeline_stats)
+        m.gauge("scheduler", self._scheduler.stats)
+        m.gauge("governor", self._governor.stats)
+        m.gauge("memory_bytes", self._memory_bytes)
+
+    def _cpu_time(self) -> float:
+        """
+        CPU seconds used by the recorder: this process, its finished child processes
+        (ffmpeg encoders) and the encoder still running, which does the x264 work.
+        """
+        times = os.times()
+        encoder = self._encoder
+        return (times.user + times.system + times.children_user + times.children_system
+                + (encoder.cpu_seconds() if encoder is not None else 0.0))
+
+    def _memory_bytes(self) -> dict:
+        ring = self._ring.stats()
+        encoder = self._encoder
+        return {
+            "frame_ring": ring["allocated_bytes"] + ring["borrowed_bytes"],
+            "cursor_track": self._cursor_track.nbytes,
+            "encoder_output": encoder.buffered_bytes if encoder is not None else 0,
+        }
+
+    def get_pipeline_stats(self) -> dict:
+        """Queue depths and dropped-frame counters for each pipeline stage."""
+        return {
+            "detect": self._detect_queue.stats() if self._detect_queue is not None else None,
+            "encode": self._encode_queue.stats() if self._encode_queue is not None else None,
+            "frame_ring": self._ring.stats(),
+        }
+
+    @staticmethod
+    def _release_frame(frame):
+        if hasattr(frame, "release"):
+            frame.release()
+
+    # ───────────────────────────────────────────────
+    # Pipeline stages
+    # ───────────────────────────────────────────────
+    def _capture_stage(self):
+        """Captures frames at the target fps and hands them to the detect stage."""
+        self._scheduler.reset()
+        self._governor.reset()
+        while True:
+            self._governor.tick()
+            self._scheduler.set_fps(self._governor.fps)
+            if self._scheduler.wait(self._stop_event) is None: break
+            self.metrics.observe("capture_lateness", self._scheduler.last_lateness_ns / 1e9)
+            capture_time = time.monotonic()
+            with self.metrics.timer("capture"):
+                frame = self._capture_frame()
+            if frame is None:
+                self.metrics.incr("capture_failed")
+            else:
+                self.metrics.incr("frames_captured")
+                self.metrics.rate("captured").mark()
+                frame.timestamp = capture_time
+                if self.cursor_mode == "deferred":
+                    self._record_cursor(capture_time)
+                self._detect_queue.put(frame)
+
+    def _detect_stage(self):
+        """Runs activity detection, drops duplicate frames, forwards the rest to the encoder and decides where sessions and segments end."""
+        idling = True
+        stored_frames = 0       # frames actually handed to the encoder
+        session_start = None
+        segment_start = None
+        session_shape = None
+        last_check = None       # capture time of the last activity check
+        last_active = None      # capture time of the last check that saw activity
+        last_hash = None
+        # Latest skipped duplicate, kept so a session ending on an unchanged
+        # screen still lasts until its real end time
+        held_duplicate = None
+
+        def close_out(keep):
+            # The held duplicate ends the video at its real time, unless the video is dropped
+            nonlocal held_duplicate
+            if held_duplicate:
+                if keep: self._encode_queue.put(held_duplicate)
+                else: held_duplicate.release()
+                held_duplicate = None
+
         try:
             while True:
-                loop_start = time.time()
-                # print(loop_start)
+                try:
+                    frame = self._detect_queue.get(timeout=1.0 / self.fps)
+                except QueueClosed:
+                    break
+
+                if frame is not None and session_shape is not None and frame.array.shape != session_shape:
+                    # A video cannot change size: a resized window (or a governor resolution
+                    # change) starts a new segment, or drops the session while still idle
+                    close_out(not idling)
+                    if idling:
+                        self._end_session(idling, notify_governor=False)
+                        session_start = None
+                    else:
+                        self._split_segment()
+                    stored_frames = 0
+                    segment_start = last_hash = None
 
-                frame = self._capture_frame()
                 if frame is not None:
-                    self._frames.append(frame)
-
-                    # ──────────────────────────────────────────────
-                    # VISUAL ACTIVITY DETECTION (SCROLLING CHECK)
-                    # ──────────────────────────────────────────────
-                    # 1. Convert to grayscale (mean of RGB) to simplify
-                    
-
-                    if len(self._frames)%self.fps == 0:
-                        curr_gray = frame.mean(axis=2)
-                        if self.prev_gray_frame is None:
-                            self.prev_gray_frame = curr_gray
-                            continue
-            
-                        # 2. Calculate pixel difference
-                        diff = np.abs(curr_gray - self.prev_gray_frame)
-                        
-                        # 3. Check for meaningful change (>15 value shift)
-                        # This ignores tiny compression noise
-                        changed_mask = diff > 15
-                        
-                        # 4. Calculate Ratio (0.0 to 1.0)
-                        change_ratio = np.mean(changed_mask)
-                        print(change_ratio)
-                        
-                        # 5. Threshold: If > 0.35% of pixels changed, it's activity
-                        if change_ratio > 0.0035: 
+                    session_shape = frame.array.shape
+                    if session_start is None:
+                        session_start = frame.timestamp
+                    if segment_start is None:
+                        segment_start = frame.timestamp
+                    checked = last_check is None or frame.timestamp - last_check >= self._governor.detect_interval
+                    if checked:
+                        last_check = frame.timestamp
+                        if self._check_visual_activity(frame.array):
                             self._mark_activity()
+                            self._governor.on_activity()
                             idling = False
-                    
-                        self.prev_gray_frame = curr_gray
-                    # ──────────────────────────────────────────────
+                            last_active = frame.timestamp
+
+                    # Rolling segments: hand finished parts of an active session to analysis
+                    # while recording continues. This frame opens the next segment. Splits wait
+                    # for a check that sees activity on this very frame, so a still screen waiting
+                    # for the idle cutoff stays with the part before it instead of ending up alone.
+                    if (not idling and stored_frames and checked and last_active == frame.timestamp
+                            and self._segment_due(segment_start, frame.timestamp, checked)):
+                        close_out(True)
+                        self._split_segment()
+                        stored_frames = 0
+                        segment_start = frame.timestamp
+                        last_hash = None
+
+                    if self.drop_duplicates:
+                        # With a deferred cursor the pixels are cursor-free, so a moved
+                        # cursor alone makes the frame distinct but not "active"
+                        frame_hash = zlib.crc32(frame.buffer)
+                        if frame.patch is not None:
+                            frame_hash = zlib.crc32(frame.patch[1], frame_hash)
+                        if self.cursor_mode == "deferred":
+                            frame_hash = (frame_hash, self._cursor_track.sample_at(frame.timestamp))
+                        if frame_hash == last_hash:
+                            self.duplicate_frames += 1
+                            self.metrics.incr("duplicate_frames")
+                            if held_duplicate: held_duplicate.release()
+                            held_duplicate, frame = frame, None
+                        else:
+                            last_hash = frame_hash
+
+                    if frame is not None:
+                        if held_duplicate:
+                            held_duplicate.release()
+                            held_duplicate = None
+                        stored_frames += 1
+                        self._encode_queue.put(frame)
 
                 now = time.time()
                 with self._activity_lock:
                     idle_time = (now - self._last_activity_time)# / 1000
-                
-                if idle_time >= self.idle_seconds or len(self._frames) >= self.max_duration * self.fps:
-                    if idling:
-                        self._frames.clear()
-                        self._mark_activity()
-                        continue
-                    vid = self._frames
-                    self._frames = []
-                    vid = self._encode_to_ram(vid)
-                    queue_lock.acquire()
-                    video_queue.append(vid)
-                    print(len(video_queue))
-                    queue_lock.release()
-                    idling = True
 
-                process_time = (time.time() - loop_start)
-                
-                sleep_time = max(0, (1.0 / self.fps) - process_time)
-                time.sleep(sleep_time)
-        # finally:
-        #     self._stop_listeners()
+                if idle_time >= self.idle_seconds or self._session_full(session_start, stored_frames):
+                    # Idle sessions are thrown away without being encoded
+                    close_out(not idling)
+                    self._end_session(idling)
+                    stored_frames = 0
+                    session_start = segment_start = session_shape = last_hash = None
+                    self._mark_activity()
+                    idling = True
+        finally:
+            close_out(not idling)
+            self._end_session(idling)
+            self._encode_queue.close()
+
+    def _segment_due(self, segment_start, timestamp, checked) -> bool:
+        """True when the open segment has reached segment_seconds, or this frame changed scene (checked: an activity check just ran on it)."""
+        age = timestamp - segment_start
+        if self.segment_seconds and age >= self.segment_seconds:
+            return True
+        if self.scene_change_ratio and age >= self.min_segment_seconds:
+            change_ratio = self.activity_detector.last_stats.get("change_ratio") or 0.0
+            return checked and change_ratio >= self.scene_change_ratio
+        return False
+
+    def _split_segment(self):
+        """Closes the current segment of an active session; the session carries on in a new one."""
+        self._session_cutoffs.append(time.monotonic())
+        self._encode_queue.put(SEGMENT_SPLIT, control=True)
+
+    def _end_session(self, idling, notify_governor=True):
+        """Tells the encode stage to drop (idle) or finalize the current session."""
+        if notify_governor:
+            self._governor.on_idle()
+        if idling:
+            self._encode_queue.put(SESSION_DISCARD, control=True)
+            return
+        self._session_cutoffs.append(time.monotonic())
+        self._encode_queue.put(SESSION_FINISH, control=True)
+
+    def _session_full(self, session_start, stored_frames) -> bool:
+        if session_start is not None and time.monotonic() - session_start >= self.max_duration:
+            return True
+        # Encode-at-end keeps the whole session in the ring
+        return bool(not self.streaming and self._ring.slots and stored_frames >= self._ring.slots)
+
+    def _check_visual_activity(self, frame) -> bool:
+        # ──────────────────────────────────────────────
+        # VISUAL ACTIVITY DETECTION (SCROLLING CHECK)
+        # ──────────────────────────────────────────────
+        with self.metrics.timer("diff"):
+            return self.activity_detector.update(frame)
+
+    def _encode_stage(self, video_queue):
+        """Feeds frames to the encoder and publishes finished segments to the video queue (a VideoChannel)."""
+        try:
+            while True:
+                try:
+                    item = self._encode_queue.get()
+                except QueueClosed:
+                    break
+
+                if item is SESSION_DISCARD:
+                    self.metrics.incr("sessions_discarded")
+                    self._discard_session()
+                elif item is SESSION_FINISH or item is SEGMENT_SPLIT:
+                    self._publish_segment(video_queue, final=item is SESSION_FINISH)
+                else:
+                    self._store_frame(item)
         except Exception as e:
-            print(f"[Recorder] Recording Error: {e}")
+            print(f"[Recorder] Encoding Error: {e}")
+        finally:
+            self._discard_session()
+
+    def _publish_segment(self, video_queue, final):
+        """Encodes the open segment and hands it to the video queue; final closes the session."""
+        cutoff = self._session_cutoffs.popleft() if self._session_cutoffs else None
+        frames = self._frame_count
+        started, ended = self._segment_start_time, self._last_frame_time
+        with self.metrics.timer("finalize"):
+            vid = self._finish_session()
+        if cutoff is not None:
+            self.metrics.observe("session_ready", time.monotonic() - cutoff)
+        self.metrics.incr("sessions_finished" if final else "segments_split")
+        self.metrics.incr("encoded_bytes", len(vid) if vid else 0)
+        self.session_log.append({
+            "session": self._session_id,
+            "segment": self._segment_index,
+            "final": final,
+            "frames": frames,
+            "bytes": len(vid) if vid else 0,
+            "ready_seconds": time.monotonic() - cutoff if cutoff is not None else None,
+        })
+        # An empty final part still goes out when earlier parts did, so readers know the session is over
+        if vid or (final and self._segment_index):
+            segment = VideoSegment(vid, self._session_id, self._segment_index, final,
+                                   started_at=wall_time(started) if vid else None,
+                                   ended_at=wall_time(ended) if vid else None, frames=frames)
+            if not video_queue.put(segment):
+                print(f"[Recorder] Video queue full, dropped {segment}")
+            self._segment_index += 1
+        self._segment_start_time = None
+        if final:
+            self._session_id += 1
+            self._segment_index = 0
+
+    def _store_frame(self, frame):
+        """Hands a captured frame slot to the encoder pipe (streaming) or keeps it for encode-at-end."""
+        self._frame_count += 1
+        self._last_frame_time = frame.timestamp
+        if self._segment_start_time is None:
+            self._segment_start_time = frame.timestamp
+        if self.cursor_mode == "deferred":
+            with self.metrics.timer("cursor"):
+                self._composite_cursor(frame)
+        self.metrics.incr("frames_encoded")
+        self.metrics.rate("encoded").mark()
+        if not self.streaming:
+            self._frames.append(frame)
+            return
+        if self._encoder is None:
+            h, w = frame.array.shape[:2]
+            input_h, input_w = frame.buffer.shape[:2]
+            self._encoder = StreamingEncoder(w, h, fps=self.fps, vfr=True,
+                                             input_pix_fmt=self.pixel_format, input_size=(input_w, input_h),
+                                             profile=self.encoder_profile)
+            try:
+                self._encoder.start()
+            except OSError as e:
+                print(f"[Recorder] Streaming encoder unavailable ({e}), falling back to encode-at-end.")
+                self._encoder = None
+                self.streaming = False
+                self._frames.append(frame)
+                return
+        try:
+            with self.metrics.timer("encode"):
+                self._encoder.write(frame.buffer, frame.timestamp, patch=frame.patch)
+        finally:
+            frame.release()
+
+    def _discard_session(self):
+        """Drops an idle session without encoding it."""
+        self._trim_cursor_track()
+        self._segment_start_time = None
+        for frame in self._frames:
+            frame.release()
+        self._frames.clear()
+        self._frame_count = 0
+        if self._encoder:
+            self._encoder.abort()
+            self._encoder = None
+
+    def _trim_cursor_track(self):
+        # Frames reach the encode stage in order, so older samples are no longer needed
+        if self._last_frame_time is not None:
+            self._cursor_track.discard_before(self._last_frame_time)
+
+    def _finish_session(self):
+        """Closes out the current session and returns its MP4 bytes."""
+        self._trim_cursor_track()
+        vid = self._frames
+        self._frames = []
+        self._frame_count = 0
+        if self._encoder:
+            encoder, self._encoder = self._encoder, None
+            print(f"[Recorder] Finalizing stream ({encoder.frames_written} frames)...")
+            return encoder.finish()
+        try:
+            timestamps = [frame.timestamp for frame in vid]
+            return self._encode_to_ram([frame.array for frame in vid], timestamps)
+        finally:
+            for frame in vid:
+                frame.release()
 
 
-    def _encode_to_ram(self, frames):
+    def _encode_to_ram(self, frames, timestamps=None):
         if not frames: return
         print(f"[Recorder] Encoding {len(frames)} frames...")
+        if timestamps:
+            h, w = frames[0].shape[:2]
+            encoder = StreamingEncoder(w, h, fps=self.fps, vfr=True, input_pix_fmt=self.pixel_format,
+                                       profile=self.encoder_profile)
+            try:
+                encoder.start()
+                for frame, timestamp in zip(frames, timestamps):
+                    encoder.write(frame, timestamp)
+                return encoder.finish()
+            except OSError as e:
+                encoder.abort()
+                print(f"[Recorder] VFR encoding unavailable ({e}), encoding at {self.fps} fps.")
+        if self.pixel_format == "bgra":
+            frames = [frame[..., 2::-1] for frame in frames]
         buffer = BytesIO()
         try:
-            iio.imwrite(buffer, frames, extension=".mp4", fps=self.fps, codec="libx264", format_hint=".mp4")
+            iio.imwrite(buffer, frames, extension=".mp4", fps=self.fps, codec="libx264", format_hint=".mp4",
+                        output_params=profile_args(self.encoder_profile, self.fps),
+                        pixelformat=self.encoder_profile.get("pix_fmt", "yuv420p"))
             buffer.seek(0)
             return buffer.getvalue()
         except Exception as e:
@@ -266,23 +716,57 @@ class IdleScreenRecorder:
 # 3. THE ENGINE (Manager)
 # ─────────────────────────────────────────────────────────
 class VideoEngine:
-    def __init__(self):
+    def __init__(self, encoder_profile=None, first_session_id=0):
         # selector = WindowSelectorGUI()
         # sid = selector.select()
         # sid = select_window()
         # print(pwc.checkPermissions())
 
-        sid = pick_window()['windowID']
+        # RECORDER_SOURCE selects the backend: quartz (window picker), mss or synthetic
+        source = create_frame_source()
+        sid = getattr(source, "window_id", None)
         # print(sid)
 
-
-
-        
-        self.recorder = IdleScreenRecorder(target_window_id=sid)
-
-        self.video_queue = []
-        self.video_queue_lock = threading.Lock()
-        print(sid)
+        # Frames are capped to RECORDER_MAX_DIMENSION on the long side (0 = native size)
+        # and optionally to RECORDER_MAX_PIXELS in total before they are buffered and encoded
+        max_dimension = int(os.getenv("RECORDER_MAX_DIMENSION", "1920")) or None
+        max_pixels = int(os.getenv("RECORDER_MAX_PIXELS", "0")) or None
+        # Capture at RECORDER_IDLE_PROBE_FPS until activity is seen (0 = always full rate), and
+        # stay within RECORDER_CPU_BUDGET cores (e.g. 0.5; 0 = no budget)
+        idle_probe_fps = float(os.getenv("RECORDER_IDLE_PROBE_FPS", "2")) or None
+        cpu_budget = float(os.getenv("RECORDER_CPU_BUDGET", "0")) or None
+        # RECORDER_PIXEL_FORMAT: "bgra" hands capture buffers to ffmpeg as they are (no
+        # conversion or copy), "rgb24" converts each frame while copying it
+        pixel_format = os.getenv("RECORDER_PIXEL_FORMAT", "bgra")
+        # RECORDER_CURSOR_MODE: "deferred" (cursor drawn at encode time), "burn" (drawn
+        # into each captured frame) or "none" (cursor-free video)
+        cursor_mode = os.getenv("RECORDER_CURSOR_MODE", "deferred")
+        # Encoder profile: the argument, else RECORDER_ENCODER_PROFILE, else fast-upload
+        encoder_profile = encoder_profile or os.getenv("RECORDER_ENCODER_PROFILE") or None
+        # Active sessions are handed over in parts every RECORDER_SEGMENT_SECONDS (0 = whole
+        # sessions only) and at scene changes above RECORDER_SCENE_CHANGE_RATIO (0 = off)
+        segment_seconds = float(os.getenv("RECORDER_SEGMENT_SECONDS", "30")) or None
+        scene_change_ratio = float(os.getenv("RECORDER_SCENE_CHANGE_RATIO", "0.5")) or None
+        self.recorder = IdleScreenRecorder(target_window_id=sid, source=source,
+                                           max_dimension=max_dimension, max_pixels=max_pixels,
+                                           idle_probe_fps=idle_probe_fps, cpu_budget=cpu_budget,
+                                           pixel_format=pixel_format, cursor_mode=cursor_mode,
+                                           encoder_profile=encoder_profile, segment_seconds=segment_seconds,
+                                           scene_change_ratio=scene_change_ratio,
+                                           first_session_id=first_session_id)
+
+        # Finished videos wait here for analysis, at most RECORDER_VIDEO_QUEUE_MAX videos and
+        # RECORDER_VIDEO_QUEUE_MAX_MB; beyond that RECORDER_VIDEO_QUEUE_POLICY decides
+        # (drop_oldest, drop_newest or block)
+        self.video_queue = VideoChannel(
+            max_videos=int(os.getenv("RECORDER_VIDEO_QUEUE_MAX", "16")),
+            max_bytes=int(float(os.getenv("RECORDER_VIDEO_QUEUE_MAX_MB", "256")) * 1024 * 1024),
+            policy=os.getenv("RECORDER_VIDEO_QUEUE_POLICY", "drop_oldest"),
+        )
+        self.recorder.metrics.gauge("video_queue", self.video_queue.stats)
+        print(sid if sid is not None else source.name)
+        # Why recording stopped, when it stopped on its own
+        self.error = None
         self.recording_thread = self.start_recording_session()
         
         # time.sleep(30)  # Give some time to initialize
@@ -295,9 +779,13 @@ class VideoEngine:
 
     def _recording_worker(self):
         try:
-            self.recorder.record_until_idle(self.video_queue, self.video_queue_lock)
+            self.recorder.record_until_idle(self.video_queue)
+            self.error = self.recorder.error
         except Exception as e:
             self.status_message = f"Error: {e}"
+            self.error = e
+        finally:
+            self.video_queue.close()
 
     def get_video_data(self):
         if not self.video_ready: return None, "No video ready."
@@ -307,17 +795,18 @@ class VideoEngine:
         self.status_message = "Idle"
         return data, "Success"
     
+    def get_metrics(self) -> dict:
+        return self.recorder.get_metrics()
+
     def check_video(self):
         return len(self.video_queue) > 0
     
-    def get_video(self):
-        self.video_queue_lock.acquire()
-        if self.video_queue:
-            video_data = self.video_queue.pop(0)
-            self.video_queue_lock.release()
-            return video_data
-        self.video_queue_lock.release()
-        return None
+    def get_video(self, timeout=0):
+        """Next finished video; waits up to timeout seconds (None = until one arrives). None if there is none."""
+        try:
+            return self.video_queue.get(timeout=timeout)
+        except QueueClosed:
+            return None
 
 
 # engine = VideoEngine()